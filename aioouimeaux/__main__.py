@@ -211,6 +211,5 @@ except KeyboardInterrupt:
 finally:
     # Close the reader
     loop.remove_reader(sys.stdin)
-    MyWeMo.stop()
-    loop.run_until_complete(aio.sleep(1))
+    loop.run_until_complete(MyWeMo.stop())
     loop.close()
@@ -0,0 +1,114 @@
+from collections import namedtuple
+
+from aioouimeaux.timeseries import _numpy
+
+# mW * s in a kWh
+_MWS_PER_KWH = 3.6e9
+
+# Insight states
+_OFF = 0
+_ON = 1
+_STANDBY = 8
+
+Summary = namedtuple("Summary", "samples duration kwh average_mw peak_mw on_time standby_time off_time")
+Summary.__doc__ = """
+Energy use over a window of samples. Durations are in seconds.
+
+Power is taken to stay at each sample's value until the next sample, as the
+samples come from events sent on change.
+"""
+
+Rollup = namedtuple("Rollup", "devices total")
+Rollup.__doc__ = """
+The Summary of each device, by name, and of all of them together.
+"""
+
+_EMPTY = Summary(0, 0.0, 0.0, 0.0, 0, 0.0, 0.0, 0.0)
+
+
+def summarize(series, count=None, since=None, until=None):
+    """
+    Summarize the energy use recorded in a PowerSeries.
+
+    @param series: The samples, e.g. Insight.history.
+    @type series:  aioouimeaux.timeseries.PowerSeries
+    @param count:  Only the latest count samples.
+    @type count:   int
+    @param since:  Only the samples taken at or after this time.
+    @type since:   float
+    @param until:  Count the latest sample as lasting until this time, e.g.
+                   now. By default the window ends at the latest sample.
+    @type until:   float
+    """
+    window = series.window(count, since)
+    if not len(window.timestamp):
+        return _EMPTY
+    if series.numpy:
+        return _summarize_numpy(window, until)
+    return _summarize_python(window, until)
+
+
+def _summarize_numpy(window, until):
+    numpy = _numpy()
+    timestamps, power, state = window.timestamp, window.current, window.state
+    if until is not None and until > timestamps[-1]:
+        timestamps = numpy.append(timestamps, until)
+    else:
+        # Drop the latest sample's interval: it has not ended
+        power = power[:len(timestamps) - 1]
+    state = state[:len(power)]
+    dt = numpy.diff(timestamps)[:len(power)]
+    duration = float(dt.sum())
+    kwh = float(numpy.dot(power, dt)) / _MWS_PER_KWH
+    on_time = float(dt[state == _ON].sum())
+    standby_time = float(dt[state == _STANDBY].sum())
+    return Summary(len(window.timestamp), duration, kwh,
+                   kwh * _MWS_PER_KWH / duration if duration else 0.0,
+                   int(window.current.max()),
+                   on_time, standby_time, duration - on_time - standby_time)
+
+
+def _summarize_python(window, until):
+    timestamps, power, state = window.timestamp, window.current, window.state
+    count = len(timestamps)
+    ends = list(timestamps[1:])
+    if until is not None and until > timestamps[-1]:
+        ends.append(until)
+    duration = mws = on_time = standby_time = 0.0
+    for i, end in enumerate(ends):
+        dt = end - timestamps[i]
+        duration += dt
+        mws += power[i] * dt
+        if state[i] == _ON:
+            on_time += dt
+        elif state[i] == _STANDBY:
+            standby_time += dt
+    return Summary(count, duration, mws / _MWS_PER_KWH,
+                   mws / duration if duration else 0.0,
+                   max(power),
+                   on_time, standby_time, duration - on_time - standby_time)
+
+
+def rollup(devices, count=None, since=None, until=None):
+    """
+    Summarize the energy use of many Insights, and of all of them together.
+    The total average is the combined load: the sum of the averages.
+
+    @param devices: Insight devices, or PowerSeries, by name.
+    @type devices:  dict
+    @return:        Rollup
+    """
+    summaries = {}
+    for name, series in devices.items():
+        series = getattr(series, "history", series)
+        summaries[name] = summarize(series, count, since, until)
+    values = summaries.values()
+    total = Summary(sum(s.samples for s in values),
+                    sum(s.duration for s in values),
+                    sum(s.kwh for s in values),
+                    sum(s.average_mw for s in values),
+                    max((s.peak_mw for s in values), default=0),
+                    sum(s.on_time for s in values),
+                    sum(s.standby_time for s in values),
+                    sum(s.off_time for s in values))
+    return Rollup(summaries, total)
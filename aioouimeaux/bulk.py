@@ -0,0 +1,50 @@
+import inspect
+import logging
+from collections import namedtuple
+
+import asyncio as aio
+
+log = logging.getLogger(__name__)
+
+# Outcome statuses
+OK = "ok"
+TIMEOUT = "timeout"
+ERROR = "error"
+
+Outcome = namedtuple("Outcome", "device status result error")
+Outcome.__doc__ = """
+What happened to one device in a bulk operation: status is OK with the
+action's result, or TIMEOUT, or ERROR with the exception raised.
+"""
+
+
+async def run_many(devices, func, limit, timeout):
+    """
+    Call func(device) for every device, each holding limit while it runs.
+
+    @param devices: The devices.
+    @type devices:  list
+    @param func:    Called with each device; may return an awaitable.
+    @type func:     function
+    @param limit:   Shared by every bulk operation, to bound them together.
+    @type limit:    asyncio.Semaphore
+    @param timeout: Seconds each device has to answer, once its turn came.
+                    None to wait for as long as it takes.
+    @type timeout:  float
+    @return:        A list of Outcome, in the order of devices.
+    """
+    async def one(device):
+        async with limit:
+            try:
+                result = func(device)
+                if inspect.isawaitable(result):
+                    result = await aio.wait_for(result, timeout)
+            except aio.TimeoutError:
+                log.debug("%r did not answer in time", device)
+                return Outcome(device, TIMEOUT, None, None)
+            except Exception as e:
+                log.debug("%r failed", device, exc_info=True)
+                return Outcome(device, ERROR, None, e)
+            return Outcome(device, OK, result, None)
+
+    return list(await aio.gather(*[one(device) for device in devices]))
@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+_MAGIC = b"aioouimeaux-cache 1"
+_MAX_SIZE = 4 * 1024 * 1024
+
+
+class DescriptionCache(object):
+    """
+    Persistent store for the XML description documents served by devices
+    (setup.xml and the service SCPDs).
+
+    Entries are keyed by a tuple of strings, e.g. (modelName, firmwareVersion,
+    SCPDURL), and stored one per file. Each file starts with a header holding
+    the length and SHA-1 of the document so a truncated or corrupted entry is
+    detected and dropped on read. When the total size goes over max_size the
+    least recently used entries are evicted. The total is counted once, then
+    kept up to date as entries come and go, so the directory is only scanned
+    again when it may have gone over.
+    """
+
+    def __init__(self, path, max_size=_MAX_SIZE):
+        """
+        @param path:     Directory holding the cache. Created if needed.
+        @type path:      str
+        @param max_size: Maximum total size of the cache in bytes.
+        @type max_size:  int
+        """
+        self.path = os.path.expanduser(path)
+        self.max_size = max_size
+        # Bytes in the cache, or None until counted
+        self._size = None
+        os.makedirs(self.path, exist_ok=True)
+
+    def _filename(self, key):
+        digest = hashlib.sha1("\0".join(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.path, digest + ".xml")
+
+    def get(self, key):
+        """
+        Return the cached document for key, or None.
+        """
+        filename = self._filename(key)
+        try:
+            with open(filename, "rb") as f:
+                header = f.readline()
+                body = f.read()
+        except OSError:
+            return None
+        try:
+            magic, length, digest = header.rsplit(b" ", 2)
+            valid = (magic == _MAGIC and int(length) == len(body) and
+                     digest.strip() == hashlib.sha1(body).hexdigest().encode())
+        except ValueError:
+            valid = False
+        if not valid:
+            log.debug("Dropping invalid cache entry %s", filename)
+            self._remove(filename)
+            return None
+        try:
+            os.utime(filename)
+        except OSError:
+            pass
+        return body
+
+    def put(self, key, body):
+        """
+        Store body, a bytes document, under key.
+        """
+        filename = self._filename(key)
+        header = b" ".join((_MAGIC, str(len(body)).encode(),
+                            hashlib.sha1(body).hexdigest().encode())) + b"\n"
+        tmpname = "%s.%d.tmp" % (filename, os.getpid())
+        replaced = _file_size(filename)
+        try:
+            with open(tmpname, "wb") as f:
+                f.write(header)
+                f.write(body)
+            os.replace(tmpname, filename)
+        except OSError as e:
+            log.warning("Could not write cache entry %s: %s", filename, e)
+            try:
+                os.remove(tmpname)
+            except OSError:
+                pass
+            return
+        if self._size is None:
+            self._evict()
+            return
+        self._size += len(header) + len(body) - replaced
+        if self._size > self.max_size:
+            self._evict()
+
+    def remove(self, key):
+        """
+        Drop the document stored under key, if any.
+        """
+        self._remove(self._filename(key))
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            if name.endswith(".xml"):
+                self._remove(os.path.join(self.path, name))
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.path):
+            if not name.endswith(".xml"):
+                continue
+            filename = os.path.join(self.path, name)
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, filename))
+            total += st.st_size
+        if total > self.max_size:
+            entries.sort()
+            for mtime, size, filename in entries:
+                if total <= self.max_size:
+                    break
+                self._remove(filename)
+                total -= size
+        self._size = total
+
+    def _remove(self, filename):
+        size = _file_size(filename)
+        try:
+            os.remove(filename)
+        except OSError:
+            return
+        if self._size is not None:
+            self._size -= size
+
+
+def _file_size(filename):
+    try:
+        return os.stat(filename).st_size
+    except OSError:
+        return 0
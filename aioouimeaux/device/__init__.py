@@ -1,16 +1,24 @@
 import logging
+import time
 from urllib.parse import urlsplit
 
 import asyncio as aio
 
 from functools import partial
 from .api.service import Service
-from .api.xsd import device as deviceParser
+from .api.dispatcher import Dispatcher
+from .api.description import parse_device
 from ..utils import requests_get
 
 
 log = logging.getLogger(__name__)
 
+# How many service descriptions of one device are downloaded concurrently.
+_SCPD_CONCURRENCY = 4
+# How long, in seconds, the state is trusted without an update. None for as
+# long as events keep it up to date.
+_STATE_TTL = None
+
 
 class DeviceUnreachable(Exception): pass
 class UnknownService(Exception): pass
@@ -18,9 +26,43 @@ class UnknownSignal(Exception): pass
 class NotACallable(Exception): pass
 
 
+def _binary_state(value):
+    """
+    Returns a BinaryState as an int. Insights send it as text with their
+    measurements after a '|'.
+    """
+    if isinstance(value, str):
+        value = value.split('|')[0]
+    return int(value)
+
+
+def _log_refresh_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        log.debug("Could not refresh the state", exc_info=future.exception())
+
+
 class Device(object):
-    def __init__(self, url):
+    def __init__(self, url, session=None, cache=None, state_ttl=_STATE_TTL):
+        """
+        @param url:       Location of the device description, setup.xml.
+        @type url:        str
+        @param session:   The HTTP session manager to use.
+        @type session:    SessionManager
+        @param cache:     Where to keep the device and service descriptions.
+        @type cache:      aioouimeaux.cache.DescriptionCache
+        @param state_ttl: How long, in seconds, get_state() answers from the
+                          last known state before fetching it again.
+        @type state_ttl:  float
+        """
         self._state = None
+        # When _state was last updated
+        self._state_at = None
+        self._refreshing = None
+        self.state_ttl = state_ttl
+        # Queues the SOAP requests to this device
+        self.dispatcher = Dispatcher()
+        self._session = session
+        self._cache = cache
         self.host = urlsplit(url).hostname
         #self.port = urlsplit(url).port
         self.services = {}
@@ -29,22 +71,64 @@ class Device(object):
         xx = aio.ensure_future(self._get_xml(url))
 
     async def _get_xml(self,url):
+        try:
+            await self._load(url)
+        except Exception as e:
+            self.initialized.set_exception(e)
+        else:
+            self.initialized.set_result(True)
+
+    async def _load(self, url):
         base_url = url.rsplit('/', 1)[0]
-        xml = await requests_get(url)
-        self._config = deviceParser.parseString(xml.raw_body).device
-        sl = self._config.serviceList
-        for svc in sl.service:
-            svcname = svc.get_serviceType().split(':')[-2]
-            service = Service(svc, base_url)
-            await service.initialized
-            service.eventSubURL = base_url + svc.get_eventSubURL()
+        self._config = await self._get_setup(url)
+        # Service descriptions only change with the model and firmware.
+        if self._config.modelName and self._config.firmwareVersion:
+            cache_key = (self._config.modelName, self._config.firmwareVersion)
+        else:
+            cache_key = None
+        # Fetch all the service descriptions at once, a few at a time.
+        limiter = aio.Semaphore(_SCPD_CONCURRENCY)
+        services = []
+        for svc in self._config.serviceList:
+            svcname = svc.serviceType.split(':')[-2]
+            service = Service(svc, base_url, session=self._session, limiter=limiter,
+                              cache=self._cache, cache_key=cache_key,
+                              dispatcher=self.dispatcher)
+            service.eventSubURL = base_url + svc.eventSubURL
+            services.append((svcname, service))
+        await aio.gather(*[service.initialized for svcname, service in services])
+        for svcname, service in services:
             self.services[svcname] = service
             setattr(self, svcname, service)
 
-        fut = self.basicevent.GetBinaryState()
-        await fut
-        self._state = fut.result()["BinaryState"]
-        self.initialized.set_result(True)
+        self._state = await self._fetch_state()
+        self._state_at = time.monotonic()
+
+    async def _get_setup(self, url):
+        """
+        Returns the parsed device description, from the cache if the device
+        does not answer.
+        """
+        key = ("setup", url)
+        try:
+            xml = await requests_get(url, session=self._session)
+        except Exception:
+            raw = None
+            if self._cache is not None:
+                raw = self._cache.get(key)
+            if raw is None:
+                raise
+            log.warning("Could not fetch %s, using the cached description", url)
+            try:
+                return parse_device(raw)
+            except Exception:
+                self._cache.remove(key)
+                raise
+        config = parse_device(xml.raw_body)
+        # Only once it parsed, or a bad download would be served from now on
+        if self._cache is not None:
+            self._cache.put(key, xml.raw_body)
+        return config
 
     def register_callback(self,signal,func):
         if func is not None:
@@ -57,18 +141,66 @@ class Device(object):
 
     def _update_state(self, value):
         self._state = int(value)
+        self._state_at = time.monotonic()
         if self._callback["statechange"]:
             if aio.iscoroutinefunction(self._callback["statechange"]):
                 aio.ensure_future(self._callback["statechange"](self))
             else:
                 self._callback["statechange"](self)
 
-    def get_state(self, force_update=False):
+    async def resync(self):
+        """
+        Fetch the state again, after events from the device were lost.
+        """
+        await self.refresh_state()
+
+    @property
+    def state_is_fresh(self):
+        """
+        Whether the last known state is recent enough to be trusted.
         """
+        if self._state is None:
+            return False
+        if self.state_ttl is None:
+            return True
+        return time.monotonic() - self._state_at < self.state_ttl
+
+    async def refresh_state(self):
+        """
+        Fetch the state from the device. Concurrent calls share one request.
+        Calls the statechange callback if the state changed.
+
         Returns 0 if off and 1 if on.
         """
-        if force_update or self._state is None:
-            xx = self.basicevent.GetBinaryState()
+        return await aio.shield(self._start_refresh())
+
+    def _start_refresh(self):
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = aio.ensure_future(self._refresh_state())
+            self._refreshing.add_done_callback(_log_refresh_failure)
+        return self._refreshing
+
+    async def _fetch_state(self):
+        response = await self.basicevent.GetBinaryState()
+        return _binary_state(response["BinaryState"])
+
+    async def _refresh_state(self):
+        state = await self._fetch_state()
+        if state != self._state:
+            self._update_state(state)
+        else:
+            self._state_at = time.monotonic()
+        return self._state
+
+    def get_state(self, force_update=False):
+        """
+        Returns 0 if off and 1 if on, as last known.
+
+        The state is fetched in the background if force_update is set or the
+        last known state is not fresh; await refresh_state() for the result.
+        """
+        if force_update or not self.state_is_fresh:
+            self._start_refresh()
         return self._state
 
     def get_service(self, name):
@@ -102,10 +234,18 @@ class Device(object):
     def name(self):
         return self._config.friendlyName
 
+    @property
+    def udn(self):
+        return self._config.UDN
+
     @property
     def serialnumber(self):
         return self._config.serialNumber
 
+    @property
+    def firmware_version(self):
+        return self._config.firmwareVersion
+
 
 def test():
     device = Device("http://10.42.1.102:49152/setup.xml")
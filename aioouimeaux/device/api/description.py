@@ -0,0 +1,182 @@
+"""
+Parsers for the UPnP description documents served by WeMo devices.
+
+Only the handful of fields the library uses are kept, in small __slots__
+records, and only the branches holding them are visited. This replaces the
+generateDS object model in .xsd, which turns every element into an object
+and is slow to import.
+"""
+from xml.etree import cElementTree as et
+
+
+class _Record(object):
+    __slots__ = ()
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            setattr(self, name, kwargs.get(name))
+
+    def __repr__(self):
+        return "<{} {}>".format(self.__class__.__name__, ", ".join(
+            "{}={!r}".format(name, getattr(self, name)) for name in self.__slots__))
+
+
+class DeviceDescription(_Record):
+    """
+    The root device of a setup.xml.
+    """
+    __slots__ = ('deviceType', 'friendlyName', 'manufacturer', 'modelDescription',
+                 'modelName', 'modelNumber', 'serialNumber', 'UDN', 'macAddress',
+                 'firmwareVersion', 'serviceList')
+
+
+class ServiceDescription(_Record):
+    """
+    One entry of a setup.xml serviceList.
+    """
+    __slots__ = ('serviceType', 'serviceId', 'SCPDURL', 'controlURL', 'eventSubURL')
+
+
+class SCPD(_Record):
+    """
+    A service description: its actions and state variables.
+    """
+    __slots__ = ('actions', 'stateVariables')
+
+
+class ActionDescription(_Record):
+    __slots__ = ('name', 'arguments')
+
+
+class ArgumentDescription(_Record):
+    __slots__ = ('name', 'direction', 'relatedStateVariable')
+
+
+class StateVariable(_Record):
+    """
+    An entry of the serviceStateTable. allowedValueRange is a (minimum,
+    maximum, step) tuple of strings, any of which may be None.
+    """
+    __slots__ = ('name', 'dataType', 'defaultValue', 'sendEvents',
+                 'allowedValues', 'allowedValueRange')
+
+
+_DEVICE_FIELDS = frozenset(DeviceDescription.__slots__) - {'serviceList'}
+_SERVICE_FIELDS = frozenset(ServiceDescription.__slots__)
+_ARGUMENT_FIELDS = frozenset(ArgumentDescription.__slots__)
+_VARIABLE_FIELDS = frozenset(('name', 'dataType', 'defaultValue'))
+_RANGE_FIELDS = ('minimum', 'maximum', 'step')
+
+
+_NAMES = {}
+
+
+def _names(ns, names):
+    """
+    Map the namespace-qualified form of each of names back to the bare name.
+    """
+    key = (ns, names)
+    try:
+        return _NAMES[key]
+    except KeyError:
+        qualified = _NAMES[key] = {ns + name: name for name in names}
+        return qualified
+
+
+def _namespace(root):
+    tag = root.tag
+    if tag.startswith('{'):
+        return tag[:tag.index('}') + 1]
+    return ''
+
+
+def _text(elem):
+    text = elem.text
+    if text is None:
+        return None
+    return text.strip() or None
+
+
+def _fill(record, elem, names):
+    for child in elem:
+        name = names.get(child.tag)
+        if name is not None:
+            setattr(record, name, _text(child))
+
+
+def parse_device(raw):
+    """
+    Parse a setup.xml document, given as bytes, into a DeviceDescription.
+    Embedded devices are ignored.
+    """
+    root = et.fromstring(raw)
+    ns = _namespace(root)
+    device = DeviceDescription()
+    services = []
+    node = root.find(ns + 'device')
+    if node is not None:
+        fields = _names(ns, _DEVICE_FIELDS)
+        service_fields = _names(ns, _SERVICE_FIELDS)
+        servicelist = ns + 'serviceList'
+        for child in node:
+            name = fields.get(child.tag)
+            if name is not None:
+                setattr(device, name, _text(child))
+            elif child.tag == servicelist:
+                for elem in child:
+                    service = ServiceDescription()
+                    _fill(service, elem, service_fields)
+                    services.append(service)
+    device.serviceList = tuple(services)
+    return device
+
+
+def parse_service(raw):
+    """
+    Parse a service description (SCPD), given as bytes, into an SCPD record.
+    """
+    root = et.fromstring(raw)
+    ns = _namespace(root)
+    actions = []
+    variables = []
+    name_tag = ns + 'name'
+    for section in root:
+        if section.tag == ns + 'actionList':
+            argument_fields = _names(ns, _ARGUMENT_FIELDS)
+            argumentlist = ns + 'argumentList'
+            for elem in section:
+                action = ActionDescription()
+                arguments = []
+                for child in elem:
+                    if child.tag == name_tag:
+                        action.name = _text(child)
+                    elif child.tag == argumentlist:
+                        for arg in child:
+                            argument = ArgumentDescription()
+                            _fill(argument, arg, argument_fields)
+                            arguments.append(argument)
+                action.arguments = tuple(arguments)
+                actions.append(action)
+        elif section.tag == ns + 'serviceStateTable':
+            variable_fields = _names(ns, _VARIABLE_FIELDS)
+            allowedlist = ns + 'allowedValueList'
+            allowedrange = ns + 'allowedValueRange'
+            range_fields = _names(ns, _RANGE_FIELDS)
+            for elem in section:
+                variable = StateVariable(sendEvents=elem.get('sendEvents'), allowedValues=())
+                for child in elem:
+                    name = variable_fields.get(child.tag)
+                    if name is not None:
+                        setattr(variable, name, _text(child))
+                    elif child.tag == allowedlist:
+                        variable.allowedValues = tuple(_text(value) for value in child)
+                    elif child.tag == allowedrange:
+                        valuerange = dict.fromkeys(_RANGE_FIELDS)
+                        for value in child:
+                            name = range_fields.get(value.tag)
+                            if name is not None:
+                                valuerange[name] = _text(value)
+                        variable.allowedValueRange = tuple(valuerange[name]
+                                                           for name in _RANGE_FIELDS)
+                variables.append(variable)
+    return SCPD(actions=tuple(actions), stateVariables=tuple(variables))
@@ -0,0 +1,118 @@
+import itertools
+from collections import Counter
+from heapq import heappush, heappop
+
+import asyncio as aio
+
+# Lanes, most urgent first: actions that change the device, then reads.
+CONTROL = 0
+READ = 1
+_LANES = {CONTROL: "control", READ: "read"}
+
+# How many requests one device gets at once. WeMo firmware copes badly with
+# more than one.
+_LIMIT = 1
+
+
+class Dispatcher(object):
+    """
+    Limits the SOAP requests in flight to one device, queueing the others
+    by lane, then in order of arrival. A waiting CONTROL request goes ahead
+    of every waiting READ request, so switching a device stays quick however
+    much telemetry is being read from it.
+    """
+
+    def __init__(self, limit=_LIMIT):
+        """
+        @param limit: How many requests may be in flight at once.
+        @type limit:  int
+        """
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters = []
+        self._counter = itertools.count()
+        self._depth = Counter()
+        self._dispatched = Counter()
+        self._waited = Counter()
+        self._max_wait = Counter()
+
+    @property
+    def depth(self):
+        """
+        Number of requests waiting for their turn.
+        """
+        return sum(self._depth.values())
+
+    async def acquire(self, lane=READ):
+        """
+        Wait for a turn to send a request in lane. Every acquire() must be
+        followed by a release().
+        """
+        loop = aio.get_event_loop()
+        start = loop.time()
+        if self.in_flight < self.limit and not self.depth:
+            self.in_flight += 1
+        else:
+            future = loop.create_future()
+            heappush(self._waiters, (lane, next(self._counter), future))
+            self._depth[lane] += 1
+            try:
+                # release() hands its slot over
+                await future
+            except aio.CancelledError:
+                if future.cancelled():
+                    self._depth[lane] -= 1
+                else:
+                    self.release()
+                raise
+        wait = loop.time() - start
+        self._dispatched[lane] += 1
+        self._waited[lane] += wait
+        if wait > self._max_wait[lane]:
+            self._max_wait[lane] = wait
+
+    def release(self):
+        while self._waiters:
+            lane, count, future = heappop(self._waiters)
+            if not future.done():
+                self._depth[lane] -= 1
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def lane(self, lane):
+        """
+        Returns an async context manager holding a turn in lane.
+        """
+        return _Turn(self, lane)
+
+    def stats(self):
+        """
+        Returns the requests in flight, and for each lane the requests waiting
+        ("depth"), dispatched so far, and their average and longest wait in
+        seconds.
+        """
+        lanes = {}
+        for lane, name in _LANES.items():
+            dispatched = self._dispatched[lane]
+            lanes[name] = {
+                "depth": self._depth[lane],
+                "dispatched": dispatched,
+                "average_wait": self._waited[lane] / dispatched if dispatched else 0.0,
+                "max_wait": self._max_wait[lane],
+            }
+        return {"in_flight": self.in_flight, "lanes": lanes}
+
+
+class _Turn(object):
+    __slots__ = ("_dispatcher", "_lane")
+
+    def __init__(self, dispatcher, lane):
+        self._dispatcher = dispatcher
+        self._lane = lane
+
+    async def __aenter__(self):
+        await self._dispatcher.acquire(self._lane)
+
+    async def __aexit__(self, *exc):
+        self._dispatcher.release()
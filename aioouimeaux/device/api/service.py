@@ -1,94 +1,293 @@
+import hashlib
 import logging
-from xml.etree import cElementTree as et
+from functools import partial
+from types import MappingProxyType
 
 from ...utils import requests_get, requests_post
-from .xsd import service as serviceParser
+from .description import parse_service
+from .dispatcher import CONTROL, READ
+from .soap import Envelope, parse_response
+from .types import ArgumentType, InvalidArgument
 import asyncio as aio
 
 log = logging.getLogger(__name__)
 
-REQUEST_TEMPLATE = """
-<?xml version="1.0" encoding="utf-8"?>
-<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">
- <s:Body>
-  <u:{action} xmlns:u="{service}">
-   {args}
-  </u:{action}>
- </s:Body>
-</s:Envelope>
-"""
+# Service schemas shared by every device, keyed by (modelName, firmwareVersion,
+# SCPDURL) and by (serviceType, SHA-1 of the SCPD).
+_SCHEMAS = {}
+# Schemas being built, so identical devices coming up together wait for the
+# first one instead of all fetching and parsing the same document.
+_LOADING = {}
+
+
+class ActionSchema(object):
+    """
+    What an action looks like for a given service type: its name, arguments
+    and SOAP headers. Shared between devices, so never modified.
+
+    Actions named Get* only read from the device, so identical calls can
+    share one request.
+
+    Each argument is typed from its related state variable, whichever its
+    direction, as WeMo descriptions often get that wrong. Actions declaring
+    no arguments send theirs as given.
+    """
+    __slots__ = ('name', 'serviceType', 'args', 'types', 'headers', 'readonly', 'envelope')
+
+    def __init__(self, serviceType, action_config, variables=None):
+        """
+        @param serviceType:   The service type.
+        @type serviceType:    str
+        @param action_config: The action, from the SCPD.
+        @type action_config:  aioouimeaux.device.api.description.ActionDescription
+        @param variables:     The state variables of the service, by name.
+        @type variables:      dict
+        """
+        self.name = action_config.name
+        self.serviceType = serviceType
+        self.headers = MappingProxyType({
+            'Content-Type': 'text/xml',
+            'SOAPACTION': '"{}#{}"'.format(serviceType, self.name)
+        })
+        self.args = tuple(arg.name for arg in action_config.arguments if arg.name)
+        variables = variables or {}
+        self.types = MappingProxyType({
+            arg.name: ArgumentType(arg.name, variables.get(arg.relatedStateVariable))
+            for arg in action_config.arguments if arg.name})
+        self.readonly = self.name.startswith('Get')
+        self.envelope = Envelope(self.name, serviceType)
+
+    def encode(self, kwargs):
+        """
+        Returns the arguments in kwargs as the text to send. Raises
+        InvalidArgument if the device would refuse them.
+        """
+        types = self.types
+        if not types:
+            return {name: str(value) for name, value in kwargs.items()}
+        encoded = {}
+        for name, value in kwargs.items():
+            argtype = types.get(name)
+            if argtype is None:
+                raise InvalidArgument("{} takes no argument {}".format(self.name, name))
+            encoded[name] = argtype.encode(value)
+        return encoded
+
+    def decode(self, values):
+        """
+        Returns the values of a response, decoded by type. Values the action
+        does not declare are left as text.
+        """
+        types = self.types
+        return {name: types[name].decode(text) if name in types else text
+                for name, text in values.items()}
+
+
+class ServiceSchema(object):
+    """
+    The actions of a service type, parsed once from its SCPD.
+    """
+    __slots__ = ('serviceType', 'actions')
+
+    def __init__(self, serviceType, scpd):
+        self.serviceType = serviceType
+        variables = {variable.name: variable for variable in scpd.stateVariables}
+        self.actions = tuple(ActionSchema(serviceType, action, variables)
+                             for action in scpd.actions)
 
 
 class Action(object):
-    def __init__(self, service, action_config):
-        self._action_config = action_config
-        self.name = action_config.get_name()
-        self.serviceType = service.serviceType
+    """
+    An action bound to one device. Everything but the control URL comes
+    from the shared ActionSchema.
+    """
+    __slots__ = ('_schema', 'controlURL', '_session', '_inflight', '_dispatcher')
+
+    def __init__(self, service, schema):
+        self._schema = schema
         self.controlURL = service.controlURL
-        self.args = {}
-        self.headers = {
-            'Content-Type': 'text/xml',
-            'SOAPACTION': '"{}#{}"'.format(self.serviceType,self.name)
-        }
-        arglist = action_config.get_argumentList()
-        if arglist is not None:
-            for arg in arglist.get_argument():
-                name = arg.get_name()
-                if name:
-                    # TODO: Get type instead of setting 0
-                    self.args[arg.get_name()] = 0
+        self._session = service._session
+        self._inflight = service._inflight
+        self._dispatcher = service._dispatcher
+
+    @property
+    def name(self):
+        return self._schema.name
+
+    @property
+    def serviceType(self):
+        return self._schema.serviceType
+
+    @property
+    def args(self):
+        return self._schema.args
+
+    @property
+    def headers(self):
+        return self._schema.headers
 
     def __call__(self,**kwargs):
         future = aio.Future()
-        aio.ensure_future(self.__do__call__(future,**kwargs))
+        try:
+            kwargs = self._schema.encode(kwargs)
+        except InvalidArgument as e:
+            # Refused before anything is sent
+            future.set_exception(e)
+            return future
+        if not self._schema.readonly:
+            task = aio.ensure_future(self.__do__call__(future,**kwargs))
+            # A caller giving up takes the request out of the queue
+            future.add_done_callback(partial(_cancel_if_cancelled, task))
+            return future
+        # While the same read is in flight on this device, share its answer
+        key = (self.name, tuple(sorted(kwargs.items())))
+        shared = self._inflight.get(key)
+        if shared is None:
+            shared = self._inflight[key] = aio.Future()
+            shared.add_done_callback(partial(self._done, key))
+            aio.ensure_future(self.__do__call__(shared, **kwargs))
+        shared.add_done_callback(partial(_copy_result, future))
         return future
 
+    def _done(self, key, shared):
+        if self._inflight.get(key) is shared:
+            del self._inflight[key]
+
     async def __do__call__(self, future, **kwargs):
         try:
-            arglist = '\n'.join('<{0}>{1}</{0}>'.format(arg, value)
-                                for arg, value in kwargs.items())
-            body = REQUEST_TEMPLATE.format(
-                action=self.name,
-                service=self.serviceType,
-                args=arglist
-            )
-            response = await requests_post(self.controlURL, data=body.strip(), headers=self.headers)
-            d = {}
-            resp = response.raw_body
-            for r in et.fromstring(resp).getchildren()[0].getchildren()[0].getchildren():
-                d[r.tag] = r.text
-            future.set_result(d)
+            body = self._schema.envelope.build(kwargs)
+            if self._dispatcher is None:
+                response = await requests_post(self.controlURL, data=body,
+                                               headers=self.headers, session=self._session)
+            else:
+                lane = READ if self._schema.readonly else CONTROL
+                async with self._dispatcher.lane(lane):
+                    response = await requests_post(self.controlURL, data=body,
+                                                   headers=self.headers, session=self._session)
+            d = self._schema.decode(parse_response(response.raw_body, self.name))
+            if not future.done():
+                future.set_result(d)
         except Exception as e:
-            future.set_exception(e)
+            if not future.done():
+                future.set_exception(e)
 
     def __repr__(self):
         return "<Action {} ({}>".format(self.name, ', '.join(self.args))
 
 
+def _cancel_if_cancelled(task, future):
+    if future.cancelled():
+        task.cancel()
+
+
+def _copy_result(future, shared):
+    """
+    Give a caller of a shared action its own copy of the result.
+    """
+    if future.done():
+        return
+    if shared.cancelled():
+        future.cancel()
+    elif shared.exception() is not None:
+        future.set_exception(shared.exception())
+    else:
+        future.set_result(dict(shared.result()))
+
+
 class Service(object):
     """
     Represents an instance of a service on a device.
     """
 
-    def __init__(self, service, base_url):
+    def __init__(self, service, base_url, session=None, limiter=None, cache=None, cache_key=None,
+                 dispatcher=None):
         self._base_url = base_url.rstrip('/')
+        self._session = session
+        self._dispatcher = dispatcher
+        self._limiter = limiter
+        self._cache = cache
+        self._cache_key = cache_key
         self._config = service
         self.actions = {}
+        # (action name, arguments) -> future of the read-only call in flight
+        self._inflight = {}
         self.initialized = aio.Future()
+        self.schema = None
         xx = aio.ensure_future(self._get_xml())
-        self._svc_config = None
 
     async def _get_xml(self):
-        url = '%s/%s' % (self._base_url, self._config.get_SCPDURL().strip('/'))
-        xml = await requests_get(url)
-        self._svc_config = serviceParser.parseString(xml.raw_body).actionList
-        for action in self._svc_config.get_action():
+        try:
+            if self._limiter is None:
+                await self._load()
+            else:
+                async with self._limiter:
+                    await self._load()
+        except Exception as e:
+            self.initialized.set_exception(e)
+        else:
+            self.initialized.set_result(True)
+
+    async def _load(self):
+        key = None
+        if self._cache_key is not None:
+            key = self._cache_key + (self._config.SCPDURL,)
+        schema = _SCHEMAS.get(key)
+        while schema is None and key is not None and key in _LOADING:
+            try:
+                schema = await aio.shield(_LOADING[key])
+            except Exception:
+                # Perhaps a failure of that device only: wait for whoever
+                # loads it next, or load it ourselves
+                log.debug("Shared load of %s failed, retrying", self._config.SCPDURL)
+                schema = _SCHEMAS.get(key)
+        if schema is None:
+            loading = aio.Future()
+            if key is not None:
+                _LOADING[key] = loading
+            try:
+                schema = await self._build_schema(key)
+            except Exception as e:
+                loading.set_exception(e)
+                loading.exception()
+                raise
+            else:
+                loading.set_result(schema)
+            finally:
+                if _LOADING.get(key) is loading:
+                    del _LOADING[key]
+        self.schema = schema
+        for action in schema.actions:
             act = Action(self, action)
-            name = action.get_name()
-            self.actions[name] = act
-            setattr(self, name, act)
-        self.initialized.set_result(True)
+            self.actions[action.name] = act
+            setattr(self, action.name, act)
+
+    async def _build_schema(self, key):
+        cached = key is not None and self._cache is not None
+        if cached:
+            raw = self._cache.get(key)
+            if raw is not None:
+                try:
+                    return self._parse_schema(key, raw)
+                except Exception:
+                    log.warning("Dropping the unreadable cached %s", self._config.SCPDURL)
+                    self._cache.remove(key)
+        url = '%s/%s' % (self._base_url, self._config.SCPDURL.strip('/'))
+        xml = await requests_get(url, session=self._session)
+        schema = self._parse_schema(key, xml.raw_body)
+        # Only once it parsed, or a bad download would be served from now on
+        if cached:
+            self._cache.put(key, xml.raw_body)
+        return schema
 
+    def _parse_schema(self, key, raw):
+        digest = (self.serviceType, hashlib.sha1(raw).hexdigest())
+        schema = _SCHEMAS.get(digest)
+        if schema is None:
+            schema = ServiceSchema(self.serviceType, parse_service(raw))
+            _SCHEMAS[digest] = schema
+        if key is not None:
+            _SCHEMAS[key] = schema
+        return schema
 
     @property
     def hostname(self):
@@ -97,8 +296,8 @@ class Service(object):
     @property
     def controlURL(self):
         return '%s/%s' % (self._base_url,
-                          self._config.get_controlURL().strip('/'))
+                          self._config.controlURL.strip('/'))
 
     @property
     def serviceType(self):
-        return self._config.get_serviceType()
+        return self._config.serviceType
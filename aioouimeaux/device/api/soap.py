@@ -0,0 +1,156 @@
+from xml.parsers import expat
+
+# Bodies cached per action for calls with the same arguments, such as
+# SetBinaryState(BinaryState=1): at most this many.
+_CACHE_SIZE = 16
+
+_PREFIX = """<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">
+ <s:Body>
+  <u:{action} xmlns:u="{service}">
+"""
+
+_SUFFIX = """  </u:{action}>
+ </s:Body>
+</s:Envelope>"""
+
+_SOAP_ENV = "http://schemas.xmlsoap.org/soap/envelope/"
+_FAULT = _SOAP_ENV + " Fault"
+# Depth of the action response or Fault element: Envelope, Body, then it
+_ACTION_DEPTH = 3
+
+
+def _escape(text):
+    # xml.sax.saxutils.escape, without importing urllib.request and
+    # http.client along with it
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+class SOAPError(Exception):
+    """
+    A response that is not a valid SOAP response to the action called.
+    """
+
+
+class SOAPFault(SOAPError):
+    """
+    The device answered with a SOAP Fault, usually a UPnPError.
+    """
+
+    def __init__(self, faultcode, faultstring, error_code=None, error_description=None):
+        super().__init__(faultcode, faultstring, error_code, error_description)
+        self.faultcode = faultcode
+        self.faultstring = faultstring
+        self.error_code = error_code
+        self.error_description = error_description
+
+    def __str__(self):
+        if self.error_code is not None:
+            return "UPnP error {} {}".format(self.error_code, self.error_description or "")
+        return "{} {}".format(self.faultcode, self.faultstring)
+
+
+class Envelope(object):
+    """
+    Builds the SOAP request bodies of one action, as bytes.
+
+    Everything but the arguments is encoded once. Argument values are
+    converted with str() and XML-escaped. Bodies are cached for calls
+    without arguments and, up to _CACHE_SIZE of them, for calls with the
+    same arguments as before.
+    """
+    __slots__ = ('_prefix', '_suffix', '_bodies')
+
+    def __init__(self, action, serviceType):
+        self._prefix = _PREFIX.format(action=action, service=serviceType).encode()
+        self._suffix = _SUFFIX.format(action=action).encode()
+        self._bodies = {(): self._prefix + self._suffix}
+
+    def build(self, kwargs):
+        """
+        Returns the request body for the arguments in kwargs.
+        """
+        try:
+            key = tuple(kwargs.items())
+            return self._bodies[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable values
+            key = None
+        args = ''.join('   <{0}>{1}</{0}>\n'.format(arg, _escape(str(value)))
+                       for arg, value in kwargs.items())
+        body = b''.join((self._prefix, args.encode(), self._suffix))
+        if key is not None and len(self._bodies) <= _CACHE_SIZE:
+            self._bodies[key] = body
+        return body
+
+
+class _Done(Exception):
+    pass
+
+
+class _ResponseReader(object):
+    """
+    expat handlers collecting the children of the element at _ACTION_DEPTH,
+    by local name, then stopping.
+    """
+    __slots__ = ('depth', 'element', 'values', 'name', 'text')
+
+    def __init__(self):
+        self.depth = 0
+        self.element = None
+        self.values = {}
+        self.name = None
+        self.text = []
+
+    def start(self, name, attrs):
+        self.depth += 1
+        if self.depth == _ACTION_DEPTH:
+            self.element = name
+        elif self.depth == _ACTION_DEPTH + 1 or self.element == _FAULT:
+            # A Fault's details are further down
+            self.name = name.rpartition(' ')[2]
+            self.text = []
+
+    def end(self, name):
+        if self.name is not None and (self.depth == _ACTION_DEPTH + 1 or self.element == _FAULT):
+            self.values[self.name] = ''.join(self.text) or None
+            self.name = None
+        self.depth -= 1
+        if self.depth < _ACTION_DEPTH and self.element is not None:
+            raise _Done()
+
+    def data(self, text):
+        if self.name is not None:
+            self.text.append(text)
+
+
+def parse_response(body, action):
+    """
+    Returns the out-arguments of a response to action, by name.
+
+    Only the elements up to the end of the action response are parsed.
+    Raises SOAPFault if the response is a SOAP Fault, and SOAPError if it
+    is not a response to action.
+    """
+    reader = _ResponseReader()
+    parser = expat.ParserCreate(namespace_separator=' ')
+    parser.buffer_text = True
+    parser.StartElementHandler = reader.start
+    parser.EndElementHandler = reader.end
+    parser.CharacterDataHandler = reader.data
+    try:
+        parser.Parse(body, True)
+    except _Done:
+        pass
+    except expat.ExpatError as e:
+        raise SOAPError("Malformed response to {}: {}".format(action, e)) from e
+    element = reader.element
+    values = reader.values
+    if element == _FAULT:
+        raise SOAPFault(values.get('faultcode'), values.get('faultstring'),
+                        values.get('errorCode'), values.get('errorDescription'))
+    if element is None or element.rpartition(' ')[2] != action + 'Response':
+        raise SOAPError("Not a response to {}: {}".format(action, element))
+    return values
@@ -0,0 +1,166 @@
+"""
+Encoding and decoding of action arguments, by the UPnP dataType of their
+related state variable.
+"""
+
+# Bounds of the UPnP integer types
+_INTEGERS = {
+    'ui1': (0, 2 ** 8 - 1),
+    'ui2': (0, 2 ** 16 - 1),
+    'ui4': (0, 2 ** 32 - 1),
+    'ui8': (0, 2 ** 64 - 1),
+    'i1': (-2 ** 7, 2 ** 7 - 1),
+    'i2': (-2 ** 15, 2 ** 15 - 1),
+    'i4': (-2 ** 31, 2 ** 31 - 1),
+    'i8': (-2 ** 63, 2 ** 63 - 1),
+    'int': (None, None),
+}
+_FLOATS = frozenset(('r4', 'r8', 'number', 'float', 'fixed.14.4'))
+# How far from a whole number of steps a float may be
+_STEP_TOLERANCE = 1e-9
+_TRUE = frozenset(('1', 'true', 'yes'))
+_FALSE = frozenset(('0', 'false', 'no'))
+
+STRING = 'string'
+INTEGER = 'integer'
+FLOAT = 'float'
+BOOLEAN = 'boolean'
+
+
+class InvalidArgument(ValueError):
+    """
+    An action argument the device would refuse. Raised before anything is
+    sent.
+    """
+
+
+class ArgumentType(object):
+    """
+    How to encode and decode the values of one argument, from its state
+    variable: the kind of value, and the bounds and allowed values it must
+    respect.
+
+    Decoding is lenient, as WeMo firmware does not always keep to its own
+    descriptions: a value that does not parse is returned as the string
+    received. A Boolean carrying another number, like an Insight's
+    BinaryState of 8, decodes to that int.
+    """
+    __slots__ = ('name', 'dataType', 'kind', 'minimum', 'maximum', 'step', 'allowed')
+
+    def __init__(self, name, variable=None):
+        """
+        @param name:     The argument name, for error messages.
+        @type name:      str
+        @param variable: Its related state variable. A plain string if None.
+        @type variable:  aioouimeaux.device.api.description.StateVariable
+        """
+        self.name = name
+        self.dataType = dataType = ((variable and variable.dataType) or STRING).lower()
+        self.minimum = self.maximum = self.step = None
+        self.allowed = frozenset(variable.allowedValues) if variable and variable.allowedValues else None
+        if dataType in _INTEGERS:
+            self.kind = INTEGER
+            self.minimum, self.maximum = _INTEGERS[dataType]
+            convert = int
+        elif dataType in _FLOATS:
+            self.kind = FLOAT
+            convert = float
+        elif dataType == BOOLEAN:
+            self.kind = BOOLEAN
+            convert = None
+        else:
+            self.kind = STRING
+            convert = None
+        if convert is not None and variable is not None and variable.allowedValueRange:
+            minimum, maximum, step = variable.allowedValueRange
+            try:
+                if minimum is not None:
+                    self.minimum = max(convert(minimum), self.minimum) \
+                        if self.minimum is not None else convert(minimum)
+                if maximum is not None:
+                    self.maximum = min(convert(maximum), self.maximum) \
+                        if self.maximum is not None else convert(maximum)
+                if step is not None and convert(step) > 0:
+                    self.step = convert(step)
+            except ValueError:
+                # Ignore a range we cannot read
+                pass
+
+    def __repr__(self):
+        return "<ArgumentType {} {}>".format(self.name, self.dataType)
+
+    def encode(self, value):
+        """
+        Returns value as the text to send. Raises InvalidArgument if the
+        device would refuse it.
+        """
+        kind = self.kind
+        if kind == STRING:
+            text = str(value)
+        elif kind == BOOLEAN:
+            text = self._encode_boolean(value)
+        else:
+            text = str(self._encode_number(value))
+        if self.allowed is not None and text not in self.allowed:
+            raise InvalidArgument("{} must be one of {}, not {!r}".format(
+                self.name, ', '.join(sorted(self.allowed)), value))
+        return text
+
+    def _encode_boolean(self, value):
+        if isinstance(value, str):
+            lowered = value.strip().lower()
+            if lowered in _TRUE:
+                return '1'
+            if lowered in _FALSE:
+                return '0'
+        elif value in (0, 1):
+            return '1' if value else '0'
+        raise InvalidArgument("{} must be a boolean, not {!r}".format(self.name, value))
+
+    def _encode_number(self, value):
+        try:
+            if self.kind == INTEGER:
+                number = int(value)
+                if number != value and str(number) != str(value).strip():
+                    raise ValueError(value)
+            else:
+                number = float(value)
+        except (TypeError, ValueError):
+            raise InvalidArgument("{} must be {} {}, not {!r}".format(
+                self.name, "an" if self.kind == INTEGER else "a", self.kind, value))
+        if (self.minimum is not None and number < self.minimum or
+                self.maximum is not None and number > self.maximum):
+            raise InvalidArgument("{} must be between {} and {}, not {!r}".format(
+                self.name, self.minimum, self.maximum, value))
+        if self.step is not None and not self._on_step(number):
+            raise InvalidArgument("{} must be a multiple of {} from {}, not {!r}".format(
+                self.name, self.step, self.minimum or 0, value))
+        return number
+
+    def _on_step(self, number):
+        offset = number - (self.minimum or 0)
+        if self.kind == INTEGER:
+            return offset % self.step == 0
+        # Floats such as 0.3 are not exact multiples of 0.1
+        steps = offset / self.step
+        return abs(steps - round(steps)) <= _STEP_TOLERANCE
+
+    def decode(self, text):
+        """
+        Returns the value of text received from the device.
+        """
+        if text is None or self.kind == STRING:
+            return text
+        try:
+            if self.kind == INTEGER:
+                return int(text)
+            if self.kind == FLOAT:
+                return float(text)
+            lowered = text.strip().lower()
+            if lowered in _TRUE:
+                return True
+            if lowered in _FALSE:
+                return False
+            return int(text)
+        except ValueError:
+            return text
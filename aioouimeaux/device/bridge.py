@@ -119,7 +119,7 @@ class Bridge(Device):
         if dim == None:
             dim = self.light_get_state(light).get('dim')
 
-        sendState = '&lt;?xml version=&quot;1.0&quot; encoding=&quot;UTF-8&quot;?&gt;&lt;DeviceStatus&gt;&lt;IsGroupAction&gt;NO&lt;/IsGroupAction&gt;&lt;DeviceID available=&quot;YES&quot;&gt;{devID}&lt;/DeviceID&gt;&lt;CapabilityID&gt;10006&lt;/CapabilityID&gt;&lt;CapabilityValue&gt;{state}&lt;/CapabilityValue&gt;&lt;CapabilityID&gt;10008&lt;/CapabilityID&gt;&lt;CapabilityValue&gt;{dim}&lt;/CapabilityValue&gt;&lt;/DeviceStatus&gt;'.format(devID=self.light_get_id(light),state=state,dim=dim)
+        sendState = '<?xml version="1.0" encoding="UTF-8"?><DeviceStatus><IsGroupAction>NO</IsGroupAction><DeviceID available="YES">{devID}</DeviceID><CapabilityID>10006</CapabilityID><CapabilityValue>{state}</CapabilityValue><CapabilityID>10008</CapabilityID><CapabilityValue>{dim}</CapabilityValue></DeviceStatus>'.format(devID=self.light_get_id(light),state=state,dim=dim)
         result = aio.Future
         future = self.bridge.SetDeviceStatus(DeviceStatusList=sendState)
         aio.ensure_future(self.light_set_state_bottom(future,result))
@@ -139,7 +139,7 @@ class Bridge(Device):
         if dim == None:
             dim = self.group_get_state(group).get('dim')
 
-        sendState = '&lt;?xml version=&quot;1.0&quot; encoding=&quot;UTF-8&quot;?&gt;&lt;DeviceStatus&gt;&lt;IsGroupAction&gt;YES&lt;/IsGroupAction&gt;&lt;DeviceID available=&quot;YES&quot;&gt;{groupID}&lt;/DeviceID&gt;&lt;CapabilityID&gt;10006&lt;/CapabilityID&gt;&lt;CapabilityValue&gt;{state}&lt;/CapabilityValue&gt;&lt;CapabilityID&gt;10008&lt;/CapabilityID&gt;&lt;CapabilityValue&gt;{dim}&lt;/CapabilityValue&gt;&lt;/DeviceStatus&gt;'.format(groupID=self.group_get_id(group),state=state,dim=dim)
+        sendState = '<?xml version="1.0" encoding="UTF-8"?><DeviceStatus><IsGroupAction>YES</IsGroupAction><DeviceID available="YES">{groupID}</DeviceID><CapabilityID>10006</CapabilityID><CapabilityValue>{state}</CapabilityValue><CapabilityID>10008</CapabilityID><CapabilityValue>{dim}</CapabilityValue></DeviceStatus>'.format(groupID=self.group_get_id(group),state=state,dim=dim)
         result = aio.Future
         future = self.bridge.SetDeviceStatus(DeviceStatusList=sendState)
         aio.ensure_future(self.group_set_state_bottom(future,result))
@@ -1,12 +1,52 @@
+import time
 from datetime import datetime
 from .switch import Switch
+from ..timeseries import PowerSeries, _CAPACITY
+from ..analytics import summarize
 import asyncio as aio
 
+# Measurements older than this, in seconds, are fetched again when read.
+# They are normally kept fresh by events.
+_MEASUREMENTS_TTL = 60
+
+
+def parse_insight_params(params):
+    """
+    Parse the pipe-delimited InsightParams, as returned by GetInsightParams
+    and sent in the BinaryState events of an Insight, into measurements.
+    """
+    (
+        state,  # 0 if off, 1 if on, 8 if on but load is off
+        lastchange,
+        onfor,  # seconds
+        ontoday,  # seconds
+        ontotal,  # seconds
+        timeperiod,  # The period over which averages are calculated
+        _x,  # This one is always 19 for me; what is it?
+        currentmw,
+        todaymw,
+        totalmw,
+        powerthreshold
+    ) = params.split('|')[:11]
+    return {'state': state,
+            'last change': datetime.fromtimestamp(int(lastchange)).strftime("%Y-%m-%d %H:%M:%S"),
+            'current on time': int(onfor),
+            'today on time': int(ontoday),
+            'total on time': int(ontotal),
+            'today consumption': int(float(todaymw)),
+            'total consumption': int(float(totalmw)),
+            'current power': int(float(currentmw))}
+
+
 class Insight(Switch):
 
 
-    def __init__(self, url):
-        super().__init__(url)
+    def __init__(self, *args, history=_CAPACITY, **kwargs):
+        """
+        @param history: How many power samples to keep in self.history.
+        @type history:  int
+        """
+        super().__init__(*args, **kwargs)
         self.measurements={'state': 0,
                 'last change': 0,
                 'current on time': 0,
@@ -15,72 +55,108 @@ class Insight(Switch):
                 'today consumption': 0,
                 'total consumption': 0,
                 'current power': 0}
+        self._measured = None
+        # When measurements last came from an event
+        self._evented = None
+        self._fetching = None
+        self.history = PowerSeries(history)
 
     def __repr__(self):
         return '<WeMo Insight "{}">'.format(self.name)
 
     @property
     def insight_params(self):
-        xx = aio.ensure_future(self._insight_params())
+        """
+        The latest measurements. They are updated by events, and only fetched
+        from the device when none came for a while.
+        """
+        if self._measured is None or time.monotonic() - self._measured > _MEASUREMENTS_TTL:
+            self._fetch()
         return self.measurements
 
+    def _fetch(self):
+        # Concurrent fetches share one GetInsightParams
+        if self._fetching is None or self._fetching.done():
+            self._fetching = aio.ensure_future(self._insight_params())
+        return self._fetching
+
+    def _update_insight(self, params):
+        """
+        Update the measurements from InsightParams received in an event.
+        """
+        try:
+            measurements = parse_insight_params(params)
+        except ValueError:
+            # Too few fields: a plain BinaryState
+            return
+        self._measure(measurements)
+        self._evented = self._measured
+
+    async def resync(self):
+        """
+        Fetch the state and the measurements again, after events from the
+        device were lost.
+        """
+        await aio.shield(self._fetch())
 
     async def _insight_params(self):
-        params = await self.insight.GetInsightParams()#.get('InsightParams')
-        params = params.get('InsightParams')
-        (
-            state,  # 0 if off, 1 if on, 8 if on but load is off
-            lastchange,
-            onfor,  # seconds
-            ontoday,  # seconds
-            ontotal,  # seconds
-            timeperiod,  # The period over which averages are calculated
-            _x,  # This one is always 19 for me; what is it?
-            currentmw,
-            todaymw,
-            totalmw,
-            powerthreshold
-        ) = params.split('|')
-        self.measurements = {'state': state,
-                'last change': datetime.fromtimestamp(int(lastchange)).strftime("%Y-%m-%d %H:%M:%S"),
-                'current on time': int(onfor),
-                'today on time': int(ontoday),
-                'total on time': int(ontotal),
-                'today consumption': int(float(todaymw)),
-                'total consumption': int(float(totalmw)),
-                'current power': int(float(currentmw))}
+        params = await self.insight.GetInsightParams()
+        self._measure(parse_insight_params(params.get('InsightParams')))
+        # Fetched, rather than evented with a BinaryState of its own: polled
+        # Insights only learn their state here
+        state = int(self.measurements['state'])
+        if state != self._state:
+            self._update_state(state)
+        else:
+            self._state_at = time.monotonic()
+
+    def _measure(self, measurements):
+        self.measurements.update(measurements)
+        self._measured = time.monotonic()
+        self.history.append(time.time(),
+                            measurements['current power'],
+                            measurements['today consumption'],
+                            measurements['total consumption'],
+                            int(measurements['state']))
+
+    def energy(self, count=None, since=None, until=None):
+        """
+        Summarize the energy use recorded in self.history. See
+        aioouimeaux.analytics.summarize.
+        """
+        return summarize(self.history, count, since, until)
 
     @property
     def today_kwh(self):
-        return self.insight_params['todaymw'] * 1.6666667e-8
+        return self.insight_params['today consumption'] * 1.6666667e-8
 
     @property
     def current_power(self):
         """
         Returns the current power usage in mW.
         """
-        return self.insight_params['currentpower']
+        return self.insight_params['current power']
 
     @property
     def today_on_time(self):
-        return self.insight_params['ontoday']
+        return self.insight_params['today on time']
 
     @property
     def on_for(self):
-        return self.insight_params['onfor']
+        return self.insight_params['current on time']
 
     @property
     def last_change(self):
-        return self.insight_params['lastchange']
+        return self.insight_params['last change']
 
     @property
     def today_standby_time(self):
-        return self.insight_params['ontoday']
+        return self.insight_params['today on time']
 
     @property
     def ontotal(self):
-        return self.insight_params['ontotal']
+        return self.insight_params['total on time']
 
     @property
     def totalmw(self):
-        return self.insight_params['totalmw']
+        return self.insight_params['total consumption']
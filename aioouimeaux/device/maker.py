@@ -9,22 +9,18 @@ class Maker(Device):
     def __repr__(self):
         return '<WeMo Maker "{}">'.format(self.name)
 
-    def get_state(self, force_update=False):
-        """
-        Returns 0 if off and 1 if on.
-        """
-        # The base implementation using GetBinaryState doesn't work for Maker (always returns 0).
-        # So pull the switch state from the atrributes instead
-        if force_update or self._state is None:
-            return(int(self.maker_attribs.get('switchstate',0)))
-        return self._state
+    async def _fetch_state(self):
+        # GetBinaryState always answers 0, so get_state, refreshes and
+        # resyncs read the switch attribute instead
+        return (await self.maker_attribs())['switchstate']
 
     def set_state(self, state):
         """
         Set the state of this device to on or off.
         """
-        self.basicevent.SetBinaryState(BinaryState=int(state))
+        future = self.basicevent.SetBinaryState(BinaryState=int(state))
         self._state = int(state)
+        return future
 
     def off(self):
         """
@@ -38,39 +34,44 @@ class Maker(Device):
         """
         return self.set_state(1)
 
-    @property
-    def maker_attribs(self):
-        makerresp = self.deviceevent.GetAttributes().get('attributeList')
-        makerresp = "<attributes>" + makerresp + "</attributes>"
-        makerresp = makerresp.replace("&gt;",">")
-        makerresp = makerresp.replace("&lt;","<")
-        attributes = et.fromstring(makerresp)
-        for attribute in attributes:
-            if attribute[0].text == "Switch":
-              switchstate = attribute[1].text
-            elif attribute[0].text == "Sensor":
-              sensorstate = attribute[1].text
-            elif attribute[0].text == "SwitchMode":
-            	switchmode = attribute[1].text
-            elif attribute[0].text == "SensorPresent":
-            	hassensor = attribute[1].text
-        return { 'switchstate' : int(switchstate),
-             'sensorstate' : int(sensorstate),
-        		 'switchmode' : int(switchmode),
-        		 'hassensor' : int(hassensor)}
+    async def maker_attribs(self):
+        """
+        Fetch the switch, sensor, switch mode and sensor presence attributes.
+        """
+        response = await self.deviceevent.GetAttributes()
+        return _parse_attributes(response['attributeList'])
+
+    async def switch_state(self):
+        return (await self.maker_attribs())['switchstate']
+
+    async def sensor_state(self):
+        return (await self.maker_attribs())['sensorstate']
 
-    @property
-    def switch_state(self):
-        return self.maker_attribs['switchstate']
+    async def switch_mode(self):
+        return (await self.maker_attribs())['switchmode']
 
-    @property
-    def sensor_state(self):
-        return self.maker_attribs['sensorstate']
+    async def has_sensor(self):
+        return (await self.maker_attribs())['hassensor']
 
-    @property
-    def switch_mode(self):
-    	return self.maker_attribs['switchmode']
 
-    @property
-    def has_sensor(self):
-    	return self.maker_attribs['hassensor']
+def _parse_attributes(makerresp):
+    """
+    Parse the attributeList returned by GetAttributes.
+    """
+    makerresp = "<attributes>" + makerresp + "</attributes>"
+    makerresp = makerresp.replace("&gt;",">")
+    makerresp = makerresp.replace("&lt;","<")
+    attributes = et.fromstring(makerresp)
+    for attribute in attributes:
+        if attribute[0].text == "Switch":
+          switchstate = attribute[1].text
+        elif attribute[0].text == "Sensor":
+          sensorstate = attribute[1].text
+        elif attribute[0].text == "SwitchMode":
+        	switchmode = attribute[1].text
+        elif attribute[0].text == "SensorPresent":
+        	hassensor = attribute[1].text
+    return { 'switchstate' : int(switchstate),
+         'sensorstate' : int(sensorstate),
+    		 'switchmode' : int(switchmode),
+    		 'hassensor' : int(hassensor)}
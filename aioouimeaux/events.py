@@ -0,0 +1,122 @@
+import logging
+from collections import deque, namedtuple, OrderedDict
+
+import asyncio as aio
+
+log = logging.getLogger(__name__)
+
+# Overflow policies of EventStream
+DROP_OLDEST = "drop-oldest"
+COALESCE_LATEST = "coalesce-latest"
+
+_MAXSIZE = 100
+
+
+Event = namedtuple("Event", "device property value timestamp seq")
+Event.__doc__ = """
+A property change reported by a device.
+
+seq is the SEQ of the NOTIFY that carried it, or None if unknown.
+"""
+
+
+class EventStream(object):
+    """
+    An async iterator over the events received by a subscription registry.
+
+    Events are queued, up to maxsize of them, so a slow consumer never holds
+    up the NOTIFY handler. When the queue is full, DROP_OLDEST discards the
+    oldest event; COALESCE_LATEST keeps only the latest value of each device
+    property, and discards the oldest of those if there are still too many.
+
+        async with wemo.events() as events:
+            async for event in events:
+                print(event.device, event.property, event.value)
+    """
+
+    def __init__(self, maxsize=_MAXSIZE, policy=DROP_OLDEST, on_close=None):
+        """
+        @param maxsize:  How many events to hold for the consumer.
+        @type maxsize:   int
+        @param policy:   DROP_OLDEST or COALESCE_LATEST.
+        @type policy:    str
+        @param on_close: Called with the stream when it is closed.
+        @type on_close:  function
+        """
+        if policy == DROP_OLDEST:
+            self._queue = deque()
+        elif policy == COALESCE_LATEST:
+            self._queue = OrderedDict()
+        else:
+            raise ValueError("Unknown overflow policy: %r" % (policy,))
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self.closed = False
+        self._on_close = on_close
+        self._waiter = None
+
+    def __len__(self):
+        return len(self._queue)
+
+    def put(self, event):
+        """
+        Queue event for the consumer. Never blocks.
+        """
+        if self.closed:
+            return
+        queue = self._queue
+        if self.policy == DROP_OLDEST:
+            if len(queue) >= self.maxsize:
+                queue.popleft()
+                self.dropped += 1
+            queue.append(event)
+        else:
+            key = (event.device.udn, event.property)
+            if queue.pop(key, None) is not None:
+                self.dropped += 1
+            elif len(queue) >= self.maxsize:
+                queue.popitem(last=False)
+                self.dropped += 1
+            queue[key] = event
+        self._wake()
+
+    def _wake(self):
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def close(self):
+        """
+        Stop receiving events. Iteration ends once the queued events are
+        consumed.
+        """
+        if not self.closed:
+            self.closed = True
+            if self._on_close is not None:
+                self._on_close(self)
+            self._wake()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._queue:
+            if self.closed:
+                raise StopAsyncIteration
+            self._waiter = aio.get_event_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        if self.policy == DROP_OLDEST:
+            return self._queue.popleft()
+        return self._queue.popitem(last=False)[1]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
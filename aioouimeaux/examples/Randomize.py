@@ -21,10 +21,10 @@ async def runme(wemo):
         await aio.sleep(90)
 
 async def doclose(wemo):
-    for switch in ( wemo.list_switches() ):
-            print("Turning Off: " + switch)
-            wemo.get_switch(switch).off()
-    await aio.sleep(1)
+    print("Turning Off: " + ", ".join(wemo.list_switches()))
+    for outcome in await wemo.off_many(wemo.list_switches()):
+        if outcome.status != "ok":
+            print("Could not turn off {}: {}".format(outcome.device.name, outcome.error or outcome.status))
 
 def register_device(device):
     xx=device.get_state()
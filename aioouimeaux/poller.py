@@ -0,0 +1,124 @@
+import logging
+import time
+from functools import partial
+from statistics import mean, pstdev
+
+from aioouimeaux.scheduler import Scheduler
+
+log = logging.getLogger(__name__)
+
+# How many GetInsightParams calls may be in flight at once, fleet-wide.
+_CONCURRENCY = 4
+_MIN_INTERVAL = 10
+_MAX_INTERVAL = 300
+# Samples used to judge how much the power varies
+_SAMPLES = 8
+# Relative standard deviation of the power above which to poll faster
+_VOLATILE = 0.1
+_FASTER = 0.5
+_SLOWER = 1.5
+_JITTER = 0.1
+# Spreads the first polls evenly, however many devices there are
+_GOLDEN = 0.6180339887498949
+
+
+class _Poll(object):
+    __slots__ = ("device", "interval")
+
+    def __init__(self, device, interval):
+        self.device = device
+        self.interval = interval
+
+
+class InsightPoller(object):
+    """
+    Polls the measurements of Insights that do not send events.
+
+    Each device has its own interval, between min_interval and max_interval.
+    It shrinks while the power varies and grows while it is steady, after
+    failures, and while events arrive anyway, in which case no poll is made.
+    First polls are spread over the interval, and at most concurrency polls
+    are in flight across all devices.
+    """
+
+    def __init__(self, concurrency=_CONCURRENCY, min_interval=_MIN_INTERVAL,
+                 max_interval=_MAX_INTERVAL):
+        """
+        @param concurrency:  How many polls may be in flight at once.
+        @type concurrency:   int
+        @param min_interval: Shortest time between polls of a device, in seconds.
+        @type min_interval:  float
+        @param max_interval: Longest time between polls of a device, in seconds.
+        @type max_interval:  float
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.scheduler = Scheduler(concurrency)
+        self._polls = {}
+        self._added = 0
+        self.polls = 0
+        self.skipped = 0
+
+    def __contains__(self, device):
+        return device.udn in self._polls
+
+    def __len__(self):
+        return len(self._polls)
+
+    def add(self, device):
+        """
+        Start polling device, an Insight.
+        """
+        if device.udn in self._polls:
+            return
+        poll = self._polls[device.udn] = _Poll(device, self.min_interval)
+        self._added += 1
+        self._schedule(poll, poll.interval * ((self._added * _GOLDEN) % 1))
+
+    def remove(self, device):
+        if self._polls.pop(device.udn, None) is not None:
+            self.scheduler.cancel(device.udn)
+
+    def interval(self, device):
+        """
+        The current polling interval of device, in seconds.
+        """
+        return self._polls[device.udn].interval
+
+    def _schedule(self, poll, delay, jitter=0):
+        self.scheduler.schedule(poll.device.udn, delay, partial(self._poll, poll), jitter=jitter)
+
+    async def _poll(self, poll):
+        device = poll.device
+        events = getattr(device, "_evented", None)
+        if events is not None and time.monotonic() - events < poll.interval:
+            # Events are arriving: no need to poll, check again later
+            self.skipped += 1
+            poll.interval = self._clamp(poll.interval * _SLOWER)
+        else:
+            try:
+                self.polls += 1
+                await device._insight_params()
+            except Exception:
+                log.debug("Could not poll %r", device, exc_info=True)
+                poll.interval = self._clamp(poll.interval * _SLOWER)
+            else:
+                poll.interval = self._clamp(poll.interval * self._factor(device))
+        if self._polls.get(device.udn) is poll:
+            self._schedule(poll, poll.interval, jitter=_JITTER)
+
+    def _factor(self, device):
+        power = [int(p) for p in device.history.window(_SAMPLES).current]
+        if len(power) < 2:
+            return 1
+        average = mean(power)
+        if average and pstdev(power, average) / average > _VOLATILE:
+            return _FASTER
+        return _SLOWER
+
+    def _clamp(self, interval):
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def close(self):
+        self._polls.clear()
+        self.scheduler.close()
@@ -0,0 +1,145 @@
+import itertools
+import logging
+import random
+from heapq import heappush, heappop
+
+import asyncio as aio
+
+log = logging.getLogger(__name__)
+
+_CONCURRENCY = 10
+
+
+class Scheduler(object):
+    """
+    Runs coroutine functions at given times from a single task.
+
+    Jobs are kept in a heap ordered by due time and identified by a key, so
+    that scheduling a key again replaces its pending job. At most concurrency
+    jobs run at the same time; the others wait their turn and count as
+    overdue.
+    """
+
+    def __init__(self, concurrency=_CONCURRENCY):
+        """
+        @param concurrency: How many jobs may run at the same time.
+        @type concurrency:  int
+        """
+        self.concurrency = concurrency
+        self._heap = []
+        self._jobs = {}
+        self._counter = itertools.count()
+        self._waiting = 0
+        self._running = set()
+        self._loop = None
+        self._semaphore = None
+        self._wakeup = None
+        self._task = None
+
+    def schedule(self, key, delay, func, jitter=0):
+        """
+        Run func() in delay seconds, replacing any pending job for key.
+
+        @param key:    Identifies the job.
+        @param delay:  Seconds from now.
+        @type delay:   float
+        @param func:   A coroutine function taking no arguments.
+        @param jitter: Fraction of delay by which the job may be brought
+                       forward at random, to spread jobs started together.
+        @type jitter:  float
+        """
+        if self._loop is None:
+            self._loop = aio.get_event_loop()
+            self._semaphore = aio.Semaphore(self.concurrency)
+            self._wakeup = aio.Event()
+        if jitter:
+            delay -= delay * random.uniform(0, jitter)
+        self.cancel(key)
+        entry = [self._loop.time() + delay, next(self._counter), key, func]
+        self._jobs[key] = entry
+        heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = aio.ensure_future(self._run())
+
+    def cancel(self, key):
+        """
+        Forget the pending job for key, if any. A job already running is not
+        interrupted.
+        """
+        entry = self._jobs.pop(key, None)
+        if entry is not None:
+            # Left in the heap, skipped when it comes up
+            entry[3] = None
+
+    def __contains__(self, key):
+        return key in self._jobs
+
+    @property
+    def pending(self):
+        """
+        Number of jobs not started yet, overdue ones included.
+        """
+        return len(self._jobs) + self._waiting
+
+    @property
+    def overdue(self):
+        """
+        Number of jobs past their due time that have not started yet.
+        """
+        if self._loop is None:
+            return 0
+        now = self._loop.time()
+        return self._waiting + sum(1 for entry in self._jobs.values() if entry[0] <= now)
+
+    async def _run(self):
+        heap = self._heap
+        while True:
+            self._wakeup.clear()
+            while heap and heap[0][3] is None:
+                heappop(heap)
+            timeout = None
+            if heap:
+                timeout = heap[0][0] - self._loop.time()
+                if timeout <= 0:
+                    self._start(heappop(heap))
+                    continue
+            try:
+                await aio.wait_for(self._wakeup.wait(), timeout)
+            except aio.TimeoutError:
+                pass
+
+    def _start(self, entry):
+        due, count, key, func = entry
+        del self._jobs[key]
+        self._waiting += 1
+        task = aio.ensure_future(self._execute(func))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _execute(self, func):
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            await func()
+        except aio.CancelledError:
+            raise
+        except Exception:
+            log.exception("Scheduled job failed")
+        finally:
+            self._semaphore.release()
+
+    def close(self):
+        """
+        Cancel all pending and running jobs.
+        """
+        for key in list(self._jobs):
+            self.cancel(key)
+        del self._heap[:]
+        if self._task is not None:
+            self._task.cancel()
+        for task in list(self._running):
+            task.cancel()
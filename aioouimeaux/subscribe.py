@@ -1,12 +1,14 @@
-from collections import defaultdict
+import itertools
 import logging
+import time
+from collections import Counter
 from xml.etree import cElementTree
 from functools import partial
 
 import asyncio as aio
-import aiohttp as aioh
-from aiohttp_wsgi import WSGIHandler
 
+from aioouimeaux.events import Event, EventStream, DROP_OLDEST
+from aioouimeaux.scheduler import Scheduler
 from aioouimeaux.utils import get_ip_address, requests_request
 from aioouimeaux.device.insight import Insight
 from aioouimeaux.device.maker import Maker
@@ -14,6 +16,16 @@ from aioouimeaux.device.maker import Maker
 from random import randint
 
 _SUBSCRIBETIMEOUT = 300
+# Subscriptions are renewed after this fraction of their timeout, brought
+# forward by up to _JITTER of it so that renewals do not all fire together.
+_RENEWAL = 0.75
+_JITTER = 0.1
+_SUBSCRIBE_CONCURRENCY = 10
+# How long to wait after losing events before fetching the state again, so
+# that one fetch covers a burst of lost events.
+_RESYNC_DELAY = 0.5
+# Event sequence numbers wrap around to 1, 0 being the initial event.
+_SEQ_WRAP = 2 ** 32
 
 log = logging.getLogger(__name__)
 
@@ -21,12 +33,80 @@ NS = "{urn:schemas-upnp-org:event-1-0}"
 SUCCESS = b'<html><body><h1>200 OK</h1></body></html>'
 
 
+class Subscription(object):
+    """
+    The event subscription of one device.
+    """
+
+    def __init__(self, device, url):
+        self.device = device
+        self.url = url
+        self.sid = None
+        self.timeout = _SUBSCRIBETIMEOUT
+        # SEQ of the last event received under the current SID
+        self.seq = None
+
+    def check_seq(self, seq):
+        """
+        Record the SEQ of an event. Returns False if events were lost in
+        between, or the device started counting again.
+        """
+        last, self.seq = self.seq, seq
+        if last is None:
+            return seq == 0
+        expected = last + 1 if last + 1 < _SEQ_WRAP else 1
+        return seq == expected
+
+    def __repr__(self):
+        return "<Subscription {} {}>".format(self.device.host, self.sid)
+
+
 class SubscriptionRegistry(object):
-    def __init__(self):
+    def __init__(self, session=None, concurrency=_SUBSCRIBE_CONCURRENCY, coalesce=0,
+                 on_failure=None):
+        """
+        @param session:     The HTTP session manager used to subscribe.
+        @type session:      SessionManager
+        @param concurrency: How many SUBSCRIBE requests may be in flight at once.
+        @type concurrency:  int
+        @param coalesce:    Coalescing window, in seconds, for all properties of
+                            all devices. See coalesce().
+        @type coalesce:     float
+        @param on_failure:  Called with a device whose subscription failed, after
+                            it is unregistered.
+        @type on_failure:   function
+        """
+        self._session = session
+        self._on_failure = on_failure
+        # device UDN -> device, and its Subscription. Devices behind one
+        # address, such as a relay or port forward, only differ by UDN.
         self._devices = {}
         self._subscriptions = {}
-        self._callbacks = defaultdict(list)
+        # host -> device, for NOTIFYs without a SID
+        self._hosts = {}
+        # SID -> Subscription, to route NOTIFYs
+        self._sids = {}
+        self.scheduler = Scheduler(concurrency)
+        # (device UDN, property) -> {token: callback}. Either may be None to
+        # match any device or any property.
+        self._handlers = {}
+        # device UDN -> keys of _handlers registered for it
+        self._device_keys = {}
+        self._tokens = itertools.count()
+        # device UDN -> pending resync task
+        self._resyncs = {}
+        self.resyncs = 0
+        self._streams = set()
+        # (device UDN, property) -> coalescing window, with None wildcards
+        self._windows = {}
+        # (device UDN, property) -> [timer, held (device, value, seq) or None]
+        self._held = {}
+        # (device UDN, property) -> number of values coalesced away
+        self.coalesced = Counter()
+        if coalesce:
+            self.coalesce(coalesce)
         self.port = randint(8300, 8990)
+        self._runner = None
 
 
     def register(self, device):
@@ -34,120 +114,350 @@ class SubscriptionRegistry(object):
             log.error("Received an invalid device: %r", device)
             return
         log.info("Subscribing to basic events from %r", device)
-        self._devices[device.host] = device
+        self._devices[device.udn] = device
+        self._hosts[device.host] = device
         self.on(device, 'BinaryState',
                     device._update_state)
+        if isinstance(device, Insight):
+            self.on(device, 'InsightParams', device._update_insight)
         self._do_resubscribe(device, device.basicevent.eventSubURL)
 
     def unregister(self, device):
-        if device.host in self._subscriptions:
-            try:
-                self._subscriptions[device.host].cancel()
-                del self._subscriptions[device.host]
-                del self._callbacks[device]
-            except:
-                pass
-            finally:
-                del self._devices[device.host]
-
-    def _do_resubscribe(self, device, url, sid=None):
-        if device.host in self._subscriptions:
-            try:
-                self._subscriptions[device.host].cancel()
-            except:
-                pass
+        subscription = self._subscriptions.pop(device.udn, None)
+        if subscription is not None:
+            self.scheduler.cancel(subscription)
+            self._sids.pop(subscription.sid, None)
+            task = self._resyncs.pop(device.udn, None)
+            if task is not None:
+                task.cancel()
+            for key in self._device_keys.pop(device.udn, ()):
+                self._handlers.pop(key, None)
+            for key in [key for key in self._held if key[0] == device.udn]:
+                self._held.pop(key)[0].cancel()
+            self._devices.pop(device.udn, None)
+            if self._hosts.get(device.host) is device:
+                del self._hosts[device.host]
+
+    def _do_resubscribe(self, device, url):
+        old = self._subscriptions.get(device.udn)
+        if old is not None:
+            self.scheduler.cancel(old)
+            self._sids.pop(old.sid, None)
+        subscription = Subscription(device, url)
+        self._subscriptions[device.udn] = subscription
+        self._schedule(subscription, 0)
+
+    def _schedule(self, subscription, delay, jitter=0):
+        self.scheduler.schedule(subscription, delay,
+                                partial(self._resubscribe, subscription), jitter=jitter)
+
+    async def _resubscribe(self, subscription):
+        device = subscription.device
         try:
-            self._subscriptions[device.host] = aio.get_event_loop().create_task(self._resubscribe(device,url,sid))
-        except:
-            pass
+            delay = await self._subscribe(subscription)
+        except Exception:
+            log.debug("Subscription to %r failed", device, exc_info=True)
+            self.unregister(device)
+            if self._on_failure is not None:
+                self._on_failure(device)
+            return
+        if self._subscriptions.get(device.udn) is subscription:
+            if delay is None:
+                self._schedule(subscription, subscription.timeout * _RENEWAL, jitter=_JITTER)
+            else:
+                self._schedule(subscription, delay)
+
+    async def _subscribe(self, subscription):
+        """
+        Send one SUBSCRIBE, or renewal, for subscription. Returns how long to
+        wait before the next one, or None for the normal renewal delay.
+        """
+        url = subscription.url
+        sid = subscription.sid
+        headers = {'TIMEOUT': 'Second-%d' % _SUBSCRIBETIMEOUT}
+        if sid is not None:
+            headers['SID'] = sid
+        else:
+            host = get_ip_address()
+            headers.update({
+                "CALLBACK": '<http://%s:%d>'%(host, self.port),
+                "NT": "upnp:event"
+            })
 
-    async def _resubscribe(self, device, url, sid=None):
+        response = await requests_request(method="SUBSCRIBE", url=url,
+                                headers=headers, session=self._session)
+        if response.status == 412 and sid:
+            # Invalid subscription ID. Send an UNSUBSCRIBE for safety and
+            # start over.
+            await requests_request(method='UNSUBSCRIBE', url=url,
+                            headers={'SID': sid}, session=self._session)
+            self._set_sid(subscription, None)
+            return 1
+        subscription.timeout = int(str(response.headers.get('timeout', _SUBSCRIBETIMEOUT)).replace(
+            'Second-', ''))
+        self._set_sid(subscription, response.headers.get('sid', sid))
+        if subscription.sid != sid:
+            return 1
+        return None
+
+    def _set_sid(self, subscription, sid):
+        if self._sids.get(subscription.sid) is subscription:
+            del self._sids[subscription.sid]
+        if subscription.sid is not None and sid != subscription.sid:
+            # A new subscription, whose events start at 0 again
+            subscription.seq = None
+        subscription.sid = sid
+        if sid is not None and self._subscriptions.get(subscription.device.udn) is subscription:
+            self._sids[sid] = subscription
+
+    def _route(self, sid, remote):
+        """
+        Find the device a NOTIFY is for, by its SID. The sender's address is
+        only used for NOTIFYs without a SID, and for those that beat the
+        SUBSCRIBE response carrying their SID.
+
+        Returns the device, and its subscription if known, or (None, None)
+        for a NOTIFY that belongs to no current subscription.
+        """
+        if sid:
+            subscription = self._sids.get(sid)
+            if subscription is not None:
+                return subscription.device, subscription
+            device = self._hosts.get(remote)
+            subscription = None if device is None else self._subscriptions.get(device.udn)
+            if subscription is not None and subscription.sid is None:
+                return device, subscription
+            log.debug("Dropping NOTIFY from %s for unknown SID %s", remote, sid)
+            return None, None
+        return self._hosts.get(remote), None
+
+    def _sequence(self, device, subscription, seq):
+        """
+        Check the SEQ header of a NOTIFY, and fetch the device state again if
+        events were lost. Returns the SEQ as an int, or None.
+        """
+        if seq is None:
+            return None
         try:
-            while True:
-                sidwaschanged = False
-                headers = {'TIMEOUT': 'Second-%d' % _SUBSCRIBETIMEOUT}
-                if sid is not None:
-                    headers['SID'] = sid
-                else:
-                    host = get_ip_address()
-                    headers.update({
-                        "CALLBACK": '<http://%s:%d>'%(host, self.port),
-                        "NT": "upnp:event"
-                    })
-
-                response = await requests_request(method="SUBSCRIBE", url=url,
-                                        headers=headers)
-                if response.status == 412 and sid:
-                    # Invalid subscription ID. Send an UNSUBSCRIBE for safety and
-                    # start over.
-                    await requests_request(method='UNSUBSCRIBE', url=url,
-                                    headers={'SID': sid})
-                    #Do I need to reset sid?
-                    sidwaschanged = True
-                    sid = None
-                else:
-                    timeout = int(response.headers.get('timeout', _SUBSCRIBETIMEOUT).replace(
-                        'Second-', ''))
-                    oldsid = sid
-                    sid = response.headers.get('sid', sid)
-                    if sid != oldsid:
-                        sidwaschanged = True
-                if sidwaschanged:
-                    await aio.sleep(1)
-                else:
-                    await aio.sleep(int(timeout * 0.75))
-        except:
-            #del self._subscriptions[device.host]
-            try:
-                self.unregister(device)
-            except:
-                pass
+            seq = int(seq)
+        except ValueError:
+            return None
+        if subscription is not None and not subscription.check_seq(seq):
+            log.debug("Lost events from %r before SEQ %d", device, seq)
+            self._request_resync(device)
+        return seq
+
+    def _request_resync(self, device):
+        if device.udn not in self._resyncs:
+            self._resyncs[device.udn] = aio.ensure_future(self._resync(device))
+
+    async def _resync(self, device):
+        await aio.sleep(_RESYNC_DELAY)
+        # Events lost from now on need a fetch of their own
+        del self._resyncs[device.udn]
+        self.resyncs += 1
+        try:
+            await device.resync()
+        except Exception:
+            log.debug("Could not fetch the state of %r", device, exc_info=True)
+
+    @property
+    def pending_renewals(self):
+        """
+        Number of subscriptions waiting to be renewed.
+        """
+        return self.scheduler.pending
+
+    @property
+    def overdue_renewals(self):
+        """
+        Number of subscriptions past their renewal time.
+        """
+        return self.scheduler.overdue
+
+    async def _handle_notify(self, request):
+        """
+        aiohttp handler for the NOTIFY requests sent by devices.
+        """
+        from aiohttp import web
+        headers = request.headers
+        device, subscription = self._route(headers.get('SID'), request.remote)
+        if device is None:
+            # Tells the device to drop the subscription
+            return web.Response(status=412)
+        seq = self._sequence(device, subscription, headers.get('SEQ'))
+        self._notify(device, await request.read(), seq)
+        return web.Response(body=SUCCESS, content_type='text/html')
 
     def _handle(self, environ, start_response):
-        device = self._devices.get(environ['REMOTE_ADDR'])
-        if device is not None:
-            data = environ['wsgi.input'].read().decode("UTF-8")
-            # trim garbage from end, if any
-            data = data.split("\n\n")[0]
-            doc = cElementTree.fromstring(data)
-            for propnode in doc.findall('./{}property'.format(NS)):
-                for property_ in propnode.getchildren():
-                    text = property_.text
-                    if isinstance(device, Insight) and property_.tag=='BinaryState':
-                        text = text.split('|')[0]
-                    self._event(device, property_.tag, text)
+        """
+        The same as _handle_notify, as a WSGI application.
+        """
+        device, subscription = self._route(environ.get('HTTP_SID'), environ['REMOTE_ADDR'])
+        if device is None:
+            start_response('412 Precondition Failed', [('Content-Length', '0')])
+            return [b'']
+        seq = self._sequence(device, subscription, environ.get('HTTP_SEQ'))
+        self._notify(device, environ['wsgi.input'].read(), seq)
         start_response('200 OK', [
             ('Content-Type', 'text/html'),
             ('Content-Length', str(len(SUCCESS)))
         ])
         return [SUCCESS]
 
-    def _event(self, device, type_, value):
-        for t, callback in self._callbacks.get(device, ()):
-            if t == type_:
+    def _notify(self, device, data, seq=None):
+        # trim garbage from end, if any
+        data = data.split(b"\n\n")[0]
+        doc = cElementTree.fromstring(data)
+        for propnode in doc.findall('./{}property'.format(NS)):
+            for property_ in propnode:
+                text = property_.text
+                if isinstance(device, Insight) and property_.tag=='BinaryState' and '|' in text:
+                    # The measurements come along with the state
+                    self._event(device, 'InsightParams', text, seq)
+                    text = text.split('|')[0]
+                self._event(device, property_.tag, text, seq)
+
+    def coalesce(self, window, device=None, type=None):
+        """
+        Deliver at most one value every window seconds for property type of
+        device: the first value of a burst at once, then only the latest
+        value at the end of each window.
+
+        Either device or type may be None to apply to any device or any
+        property; the most specific setting wins. A window of 0 delivers
+        every value.
+        """
+        key = (None if device is None else device.udn, type)
+        if window:
+            self._windows[key] = window
+        else:
+            self._windows.pop(key, None)
+
+    def _window(self, udn, type_):
+        windows = self._windows
+        for key in ((udn, type_), (udn, None), (None, type_), (None, None)):
+            window = windows.get(key)
+            if window is not None:
+                return window
+        return 0
+
+    def _event(self, device, type_, value, seq=None):
+        if self._windows:
+            udn = device.udn
+            window = self._window(udn, type_)
+            if window:
+                key = (udn, type_)
+                held = self._held.get(key)
+                if held is not None:
+                    if held[1] is not None:
+                        self.coalesced[key] += 1
+                    held[1] = (device, value, seq)
+                    return
+                timer = aio.get_event_loop().call_later(window, self._release, key, window)
+                self._held[key] = [timer, None]
+        self._dispatch(device, type_, value, seq)
+
+    def _release(self, key, window):
+        """
+        End a coalescing window, delivering the value held back, if any.
+        """
+        held = self._held.pop(key)
+        if held[1] is not None:
+            device, value, seq = held[1]
+            # Start the next window
+            timer = aio.get_event_loop().call_later(window, self._release, key, window)
+            self._held[key] = [timer, None]
+            self._dispatch(device, key[1], value, seq)
+
+    def _dispatch(self, device, type_, value, seq):
+        udn = device.udn
+        handlers = self._handlers.get((udn, type_))
+        if handlers:
+            for callback in list(handlers.values()):
                 callback(value)
+        for key in ((udn, None), (None, type_), (None, None)):
+            handlers = self._handlers.get(key)
+            if handlers:
+                for callback in list(handlers.values()):
+                    callback(device, type_, value)
+        if self._streams:
+            event = Event(device, type_, value, time.time(), seq)
+            for stream in self._streams:
+                stream.put(event)
+
+    def stream(self, maxsize=100, policy=DROP_OLDEST):
+        """
+        Returns an EventStream of all the events received from now on.
+        """
+        stream = EventStream(maxsize, policy, on_close=self._streams.discard)
+        self._streams.add(stream)
+        return stream
 
     def on(self, device, type, callback):
-        self._callbacks[device].append((type, callback))
+        """
+        Call callback when device reports a new value for property type.
+
+        Either device or type may be None to match any device or any
+        property. Callbacks for one device and one property are called
+        with the value only; wildcard callbacks with (device, type, value).
+
+        Returns a handle to give to off().
+        """
+        udn = None if device is None else device.udn
+        key = (udn, type)
+        token = next(self._tokens)
+        self._handlers.setdefault(key, {})[token] = callback
+        if udn is not None:
+            self._device_keys.setdefault(udn, set()).add(key)
+        return (key, token)
+
+    def off(self, handle):
+        """
+        Remove a callback added with on().
+        """
+        key, token = handle
+        handlers = self._handlers.get(key)
+        if handlers is not None:
+            handlers.pop(token, None)
+            if not handlers:
+                del self._handlers[key]
+                keys = self._device_keys.get(key[0])
+                if keys is not None:
+                    keys.discard(key)
 
 
     def close(self):
-        for task in self._subscriptions.values():
-            try:
-                task.cancel()
-            except:
-                pass
+        """
+        Stop renewing subscriptions and dispatching events. Returns a future
+        done once the HTTP server is shut down, or None if it never started.
+        """
+        self.scheduler.close()
+        for task in self._resyncs.values():
+            task.cancel()
+        self._resyncs.clear()
+        for stream in list(self._streams):
+            stream.close()
+        for timer, held in self._held.values():
+            timer.cancel()
+        self._held.clear()
+        runner, self._runner = self._runner, None
+        if runner is not None:
+            return aio.ensure_future(runner.cleanup())
 
     @property
     def server(self):
         """
-        UDP server to listen for responses.
+        Coroutine starting the HTTP server that receives the NOTIFYs.
         """
-        server = getattr(self, "_server", None)
-        if server is None:
-            wsgi_handler = WSGIHandler(self._handle)
-            app=aioh.web.Application()
-            app.router.add_route("*",'/{path_info:.*}', wsgi_handler)
-            whandler = app.make_handler(logger=log)
-            server = aio.get_event_loop().create_server(whandler,host='',port=self.port)
-        return server
+        return self._serve()
+
+    async def _serve(self):
+        if self._runner is not None:
+            return
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_route("*", '/{path_info:.*}', self._handle_notify)
+        self._runner = web.AppRunner(app, logger=log)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, port=self.port).start()
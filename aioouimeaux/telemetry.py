@@ -0,0 +1,263 @@
+import csv
+import io
+import logging
+import mmap
+import os
+import re
+import struct
+from array import array
+from bisect import bisect_right
+
+from aioouimeaux.timeseries import Window, _TYPECODES, _numpy
+
+log = logging.getLogger(__name__)
+
+BINARY = "binary"
+CSV = "csv"
+
+_MAX_BYTES = 16 * 1024 * 1024
+_KEEP = 8
+_BUFFER_SIZE = 64 * 1024
+
+# File header: magic, format version, record size, reserved
+_HEADER = struct.Struct("<8sHH4x")
+_MAGIC = b"WEMOTLM\0"
+_VERSION = 1
+# One sample: timestamp, current mW, today mW-min, total mW-min, state
+_RECORD = struct.Struct("<" + "".join(_TYPECODES))
+_NUMPY_DTYPE = [(name, "<" + code) for name, code in zip(Window._fields, ("f8", "i8", "i8", "i8", "i1"))]
+
+_EXTENSIONS = {BINARY: ".wtl", CSV: ".csv"}
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def _device_name(device):
+    return _UNSAFE.sub("_", device.udn)
+
+
+class TelemetrySink(object):
+    """
+    Writes Insight power samples to rotating, append-only files, one series
+    of files per device.
+
+    The binary format is a 16 byte header followed by packed fixed-size
+    records, which read() maps into memory. The CSV format is the same
+    samples as text, for tools that cannot read the binary one.
+
+    Samples are buffered per device and written out once buffer_size bytes
+    are waiting, on flush() or on close(). When a file grows past max_bytes,
+    the next one is started, and only the latest keep files of each device
+    are kept.
+    """
+
+    def __init__(self, directory, format=BINARY, max_bytes=_MAX_BYTES, keep=_KEEP,
+                 buffer_size=_BUFFER_SIZE):
+        """
+        @param directory:   Where to write the files. Created if missing.
+        @type directory:    str
+        @param format:      BINARY or CSV.
+        @type format:       str
+        @param max_bytes:   Size at which to start a new file.
+        @type max_bytes:    int
+        @param keep:        How many files to keep per device, None for all.
+        @type keep:         int
+        @param buffer_size: How many bytes to buffer per device before writing.
+        @type buffer_size:  int
+        """
+        if format not in _EXTENSIONS:
+            raise ValueError("Unknown telemetry format: %r" % (format,))
+        self.directory = directory
+        self.format = format
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.buffer_size = buffer_size
+        os.makedirs(directory, exist_ok=True)
+        # device name -> bytearray of records not written yet
+        self._buffers = {}
+        # device name -> timestamp of the latest sample taken from its history
+        self._exported = {}
+        # device name -> file being appended to
+        self._paths = {}
+
+    def write(self, device, timestamp, current, today, total, state):
+        """
+        Add one sample of device.
+        """
+        name = _device_name(device)
+        buf = self._buffers.get(name)
+        if buf is None:
+            buf = self._buffers[name] = bytearray()
+        if self.format == BINARY:
+            buf += _RECORD.pack(timestamp, current, today, total, state)
+        else:
+            buf += b"%r,%d,%d,%d,%d\n" % (float(timestamp), current, today, total, state)
+        if len(buf) >= self.buffer_size:
+            self._flush(name)
+
+    def write_series(self, device, series=None):
+        """
+        Add the samples of a PowerSeries, by default device.history, taken
+        since the last call for this device.
+        """
+        if series is None:
+            series = device.history
+        name = _device_name(device)
+        window = series.window()
+        timestamps = window.timestamp
+        last = self._exported.get(name)
+        start = 0
+        if last is not None:
+            if series.numpy:
+                start = int(timestamps.searchsorted(last, side="right"))
+            else:
+                start = bisect_right(timestamps, last)
+        if start >= len(timestamps):
+            return
+        self._exported[name] = timestamps[-1]
+        if self.format == BINARY and series.numpy:
+            numpy = _numpy()
+            records = numpy.empty(len(timestamps) - start, dtype=_NUMPY_DTYPE)
+            for field, column in zip(Window._fields, window):
+                records[field] = column[start:]
+            buf = self._buffers.setdefault(name, bytearray())
+            buf += records.tobytes()
+            if len(buf) >= self.buffer_size:
+                self._flush(name)
+        else:
+            for i in range(start, len(timestamps)):
+                self.write(device, *[column[i] for column in window])
+
+    def write_event(self, event):
+        """
+        Add the sample carried by an InsightParams event. Other events are
+        ignored.
+        """
+        if event.property != "InsightParams":
+            return
+        from aioouimeaux.device.insight import parse_insight_params
+        try:
+            measurements = parse_insight_params(event.value)
+        except ValueError:
+            return
+        self.write(event.device, event.timestamp,
+                   measurements['current power'],
+                   measurements['today consumption'],
+                   measurements['total consumption'],
+                   int(measurements['state']))
+
+    async def consume(self, stream):
+        """
+        Write the samples of an EventStream, e.g. WeMo.events(), until it
+        ends. Buffers are flushed every time the stream runs dry.
+        """
+        async for event in stream:
+            self.write_event(event)
+            if not len(stream):
+                self.flush()
+        self.flush()
+
+    def flush(self):
+        for name in list(self._buffers):
+            self._flush(name)
+
+    def close(self):
+        self.flush()
+
+    def _flush(self, name):
+        buf = self._buffers.pop(name, None)
+        if not buf:
+            return
+        path = self._paths.get(name)
+        if path is None or os.path.getsize(path) >= self.max_bytes:
+            path = self._paths[name] = self._current(name)
+        exists = os.path.exists(path)
+        with open(path, "ab") as f:
+            if not exists:
+                f.write(self._header())
+            f.write(buf)
+
+    def _header(self):
+        if self.format == BINARY:
+            return _HEADER.pack(_MAGIC, _VERSION, _RECORD.size)
+        return ",".join(Window._fields).encode() + b"\n"
+
+    def _current(self, name):
+        """
+        Path of the file to append the samples of device name to, rotating
+        files as needed.
+        """
+        paths = files(self.directory, name, self.format)
+        if not paths:
+            index = 0
+        else:
+            path = paths[-1]
+            if os.path.getsize(path) < self.max_bytes:
+                return path
+            index = _index(path) + 1
+            if self.keep is not None:
+                for old in paths[:len(paths) + 1 - self.keep]:
+                    os.remove(old)
+        return os.path.join(self.directory, "%s.%06d%s" % (name, index, _EXTENSIONS[self.format]))
+
+
+def _index(path):
+    return int(os.path.basename(path).rsplit(".", 2)[1])
+
+
+def files(directory, device, format=BINARY):
+    """
+    The telemetry files of device in directory, oldest first.
+
+    @param device: A device, or its name in file names.
+    """
+    name = device if isinstance(device, str) else _device_name(device)
+    extension = _EXTENSIONS[format]
+    paths = [os.path.join(directory, entry) for entry in os.listdir(directory)
+             if entry.startswith(name + ".") and entry.endswith(extension)
+             and entry[len(name) + 1:-len(extension)].isdigit()]
+    return sorted(paths, key=_index)
+
+
+def read(path):
+    """
+    Read back a telemetry file as a Window of columns.
+
+    Binary files are memory-mapped: with numpy the columns are views of the
+    mapping; without it they are arrays unpacked from it. CSV files are
+    parsed into arrays.
+    """
+    if path.endswith(_EXTENSIONS[CSV]):
+        return _read_csv(path)
+    with open(path, "rb") as f:
+        header = f.read(_HEADER.size)
+        magic, version, size = _HEADER.unpack(header)
+        if magic != _MAGIC or version != _VERSION or size != _RECORD.size:
+            raise ValueError("Not a telemetry file: %s" % path)
+        count = (os.fstat(f.fileno()).st_size - _HEADER.size) // _RECORD.size
+        numpy = _numpy()
+        if numpy is not None and count:
+            records = numpy.memmap(f, dtype=_NUMPY_DTYPE, mode="r",
+                                   offset=_HEADER.size, shape=(count,))
+            return Window(*[records[field] for field in Window._fields])
+        if numpy is not None:
+            return Window(*[numpy.zeros(0, dtype=dtype) for name, dtype in _NUMPY_DTYPE])
+        columns = Window(*[array(code) for code in _TYPECODES])
+        if count:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+                end = _HEADER.size + count * _RECORD.size
+                for record in _RECORD.iter_unpack(mapping[_HEADER.size:end]):
+                    for column, value in zip(columns, record):
+                        column.append(value)
+        return columns
+
+
+def _read_csv(path):
+    columns = Window(*[array(code) for code in _TYPECODES])
+    with io.open(path, newline="") as f:
+        rows = csv.reader(f)
+        next(rows)
+        for row in rows:
+            columns.timestamp.append(float(row[0]))
+            for column, value in zip(columns[1:], row[1:]):
+                column.append(int(value))
+    return columns
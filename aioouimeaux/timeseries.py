@@ -0,0 +1,132 @@
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+# Samples kept by default: a day of one sample a minute, or so.
+_CAPACITY = 1440
+
+Window = namedtuple("Window", "timestamp current today total state")
+
+# Column typecodes: seconds since the epoch, mW, mW-minutes, mW-minutes, state
+_TYPECODES = Window("d", "q", "q", "q", "b")
+
+_NUMPY = []
+
+
+def _numpy():
+    """
+    Returns the numpy module, or None if it is not installed. Imported on
+    first use only, it is slow to import.
+    """
+    if not _NUMPY:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _NUMPY.append(numpy)
+    return _NUMPY[0]
+
+
+class PowerSeries(object):
+    """
+    A fixed-size ring buffer of Insight power samples.
+
+    Every column is one flat array of twice the capacity, and each sample is
+    written at two positions capacity apart. The latest samples are then
+    always contiguous, so windows are views into the arrays rather than
+    copies: numpy arrays if numpy is installed, memoryviews otherwise.
+    """
+
+    def __init__(self, capacity=_CAPACITY, use_numpy=None):
+        """
+        @param capacity:  How many samples to keep.
+        @type capacity:   int
+        @param use_numpy: Whether to store samples in numpy arrays. By default,
+                          when numpy is installed.
+        @type use_numpy:  bool
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        numpy = _numpy() if use_numpy is not False else None
+        if use_numpy and numpy is None:
+            raise ImportError("numpy is not installed")
+        self.capacity = capacity
+        self.numpy = numpy is not None
+        size = 2 * capacity
+        if numpy is not None:
+            self._columns = Window(*[numpy.zeros(size, dtype=numpy.dtype(code))
+                                     for code in _TYPECODES])
+            self._views = self._columns
+        else:
+            self._columns = Window(*[array(code, bytes(size * array(code).itemsize))
+                                     for code in _TYPECODES])
+            self._views = Window(*[memoryview(column) for column in self._columns])
+        # Where the next sample goes, in [0, capacity)
+        self._next = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def append(self, timestamp, current, today, total, state):
+        """
+        Add a sample, replacing the oldest one if the buffer is full.
+        """
+        i = self._next
+        j = i + self.capacity
+        columns = self._columns
+        for column, value in zip(columns, (timestamp, current, today, total, state)):
+            column[i] = column[j] = value
+        self._next = i + 1 if i + 1 < self.capacity else 0
+        if self._len < self.capacity:
+            self._len += 1
+
+    def _start(self):
+        # Index of the oldest sample, such that [start, start + len) is contiguous
+        return self._next + self.capacity - self._len
+
+    def window(self, count=None, since=None):
+        """
+        Returns a Window of views of the latest samples, oldest first. The
+        views share memory with the buffer: they are only valid until count
+        more samples are appended.
+
+        @param count: How many samples, at most. All by default.
+        @type count:  int
+        @param since: Only samples taken at or after this time. Timestamps are
+                      assumed to be appended in order.
+        @type since:  float
+        """
+        end = self._next + self.capacity
+        start = self._start()
+        if count is not None:
+            start = max(start, end - count)
+        if since is not None:
+            timestamps = self._views.timestamp
+            if self.numpy:
+                start += int(timestamps[start:end].searchsorted(since))
+            else:
+                start = bisect_left(timestamps, since, start, end)
+        return Window(*[view[start:end] for view in self._views])
+
+    def latest(self):
+        """
+        Returns the latest sample as a Window of values, or None if empty.
+        """
+        if not self._len:
+            return None
+        i = self._next + self.capacity - 1
+        return Window(*[column[i] for column in self._columns])
+
+    def clear(self):
+        self._next = 0
+        self._len = 0
+
+    @property
+    def nbytes(self):
+        """
+        Memory used by the samples, in bytes.
+        """
+        if self.numpy:
+            return sum(column.nbytes for column in self._columns)
+        return sum(len(column) * column.itemsize for column in self._columns)
@@ -4,9 +4,9 @@ import struct
 import time
 
 import asyncio as aio
-import aiohttp as aioh
-import async_timeout as aioto
-import netifaces
+
+# aiohttp, async_timeout and netifaces are slow to import. They are imported
+# where they are used so that importing the library stays cheap.
 
 
 def tz_hours():
@@ -40,6 +40,7 @@ def get_timesync():
 
 
 def get_ip_address():
+    import netifaces
     return netifaces.ifaddresses(netifaces.gateways()["default"][netifaces.AF_INET][1])[netifaces.AF_INET][0]["addr"]
 
 def matcher(match_string):
@@ -55,65 +56,115 @@ _RETRIES = 3
 _DELAY = 3
 _TIMEOUT = 13
 
+# Connection pool defaults. WeMo firmware copes badly with many parallel
+# connections, so only a few are kept per device.
+_POOL_LIMIT = 100
+_POOL_LIMIT_PER_HOST = 4
+_KEEPALIVE_TIMEOUT = 30
+
 def get_retries():
     return _RETRIES
 
-async def requests_get(url, *, allow_redirects=True, **kwargs):
-    remaining = _RETRIES
-    while remaining:
-        remaining -= 1
-        try:
-            with aioto.timeout(_TIMEOUT):
-                async with aioh.ClientSession() as session:
-                    async with session.get(url, allow_redirects=allow_redirects, **kwargs) as response:
-                        if response.status != 200:
+
+class SessionManager(object):
+    """
+    Owns a single aiohttp ClientSession shared by every device, service and
+    subscription of a WeMo environment. Connections are pooled and kept alive
+    per host.
+    """
+
+    def __init__(self, limit=_POOL_LIMIT, limit_per_host=_POOL_LIMIT_PER_HOST,
+                 keepalive_timeout=_KEEPALIVE_TIMEOUT):
+        """
+        @param limit:             Maximum number of simultaneous connections.
+        @type limit:              int
+        @param limit_per_host:    Maximum number of simultaneous connections to one device.
+        @type limit_per_host:     int
+        @param keepalive_timeout: Seconds an idle connection is kept open.
+        @type keepalive_timeout:  float
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+        self._closed = False
+
+    @property
+    def session(self):
+        if self._closed:
+            raise RuntimeError("Session manager is closed")
+        if self._session is None or self._session.closed:
+            import aiohttp as aioh
+            connector = aioh.TCPConnector(limit=self.limit,
+                                          limit_per_host=self.limit_per_host,
+                                          keepalive_timeout=self.keepalive_timeout)
+            self._session = aioh.ClientSession(connector=connector)
+        return self._session
+
+    @property
+    def closed(self):
+        return self._closed
+
+    async def get(self, url, *, allow_redirects=True, **kwargs):
+        return await self.request("GET", url, allow_redirects=allow_redirects,
+                                  check_status=True, **kwargs)
+
+    async def post(self, url, *, data=None, **kwargs):
+        return await self.request("POST", url, data=data, **kwargs)
+
+    async def request(self, method, url, *, check_status=False, **kwargs):
+        import aiohttp as aioh
+        import async_timeout as aioto
+        remaining = _RETRIES
+        while remaining:
+            remaining -= 1
+            try:
+                async with aioto.timeout(_TIMEOUT):
+                    async with self.session.request(method, url, **kwargs) as response:
+                        if check_status and response.status != 200:
                             raise aioh.ClientConnectionError
                         response.raw_body = await response.read()
                         return response
-        except aio.TimeoutError:
-            if not remaining:
-                raise aioh.ClientConnectionError
-            await aio.sleep(_DELAY)
-        except aioh.ClientConnectionError:
-            if not remaining:
-                raise
-            await aio.sleep(_DELAY)
-
-async def requests_post(url, *, data=None, **kwargs):
-    remaining = _RETRIES
-    while remaining:
-        remaining -= 1
-        try:
-            with aioto.timeout(_TIMEOUT):
-                async with aioh.ClientSession() as session:
-                    async with session.post(url, data = data, **kwargs) as response:
-                        response.raw_body = await response.read()
-                        return response
-        except aio.TimeoutError:
-            if not remaining:
-                raise aioh.ClientConnectionError
-            await aio.sleep(_DELAY)
-        except aioh.ClientConnectionError:
-            if not remaining:
-                raise
-            await aio.sleep(_DELAY)
-
-async def requests_request(method, url, **kwargs):
-    remaining = _RETRIES
-    while remaining:
-        remaining -= 1
-        try:
-            with aioto.timeout(_TIMEOUT):
-                async with aioh.ClientSession() as session:
-                    async with session.request(method, url, **kwargs) as response:
-                        response.raw_body = await response.read()
-                        return response
-        except aio.TimeoutError:
-            if not remaining:
-                raise aioh.ClientConnectionError
-            await aio.sleep(_DELAY)
-        except aioh.ClientConnectionError:
-            if not remaining:
-                raise
-            await aio.sleep(_DELAY)
-
+            except aio.TimeoutError:
+                if not remaining:
+                    raise aioh.ClientConnectionError
+                await aio.sleep(_DELAY)
+            except aioh.ServerDisconnectedError:
+                # Most likely a pooled connection the device already dropped.
+                # Retry straight away on a fresh one.
+                if not remaining:
+                    raise
+            except aioh.ClientConnectionError:
+                if not remaining:
+                    raise
+                await aio.sleep(_DELAY)
+
+    async def close(self):
+        self._closed = True
+        if self._session is not None:
+            session, self._session = self._session, None
+            await session.close()
+
+
+async def _one_shot(name, *args, **kwargs):
+    # Used when no SessionManager is given; behaves like the old helpers.
+    manager = SessionManager()
+    try:
+        return await getattr(manager, name)(*args, **kwargs)
+    finally:
+        await manager.close()
+
+async def requests_get(url, *, session=None, allow_redirects=True, **kwargs):
+    if session is None:
+        return await _one_shot("get", url, allow_redirects=allow_redirects, **kwargs)
+    return await session.get(url, allow_redirects=allow_redirects, **kwargs)
+
+async def requests_post(url, *, session=None, data=None, **kwargs):
+    if session is None:
+        return await _one_shot("post", url, data=data, **kwargs)
+    return await session.post(url, data=data, **kwargs)
+
+async def requests_request(method, url, *, session=None, **kwargs):
+    if session is None:
+        return await _one_shot("request", method, url, **kwargs)
+    return await session.request(method, url, **kwargs)
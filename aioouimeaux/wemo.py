@@ -2,17 +2,12 @@ import logging
 
 import socket
 import asyncio as aio
+from importlib import import_module
 
+from aioouimeaux.bulk import run_many
 from aioouimeaux.device import DeviceUnreachable
-from aioouimeaux.device.switch import Switch
-from aioouimeaux.device.insight import Insight
-from aioouimeaux.device.maker import Maker
-from aioouimeaux.device.lightswitch import LightSwitch
-from aioouimeaux.device.motion import Motion
-from aioouimeaux.device.bridge import Bridge
 from aioouimeaux.discovery import UPnP, UPNP_PORT, UPNP_ADDR
-from aioouimeaux.subscribe import SubscriptionRegistry
-from aioouimeaux.utils import matcher
+from aioouimeaux.utils import matcher, SessionManager
 from functools import partial
 
 
@@ -25,6 +20,44 @@ reqlog.disabled = True
 
 _LOTYPES=["Switch","Motion","Bridge", "Maker"]
 
+# How many devices bulk operations talk to at once, all together
+_BULK_CONCURRENCY = 32
+# How long, in seconds, each device has to answer in a bulk operation
+_BULK_TIMEOUT = 10
+
+# Device classes and the subscription registry are only imported when needed,
+# to keep "import aioouimeaux.wemo" cheap for short-lived scripts.
+_LAZY = {
+    "Switch": "aioouimeaux.device.switch",
+    "LightSwitch": "aioouimeaux.device.lightswitch",
+    "Insight": "aioouimeaux.device.insight",
+    "Motion": "aioouimeaux.device.motion",
+    "Bridge": "aioouimeaux.device.bridge",
+    "Maker": "aioouimeaux.device.maker",
+    "SubscriptionRegistry": "aioouimeaux.subscribe",
+}
+
+# USN prefix, type it must be listed under, device class
+_USN_CLASSES = (
+    ("uuid:Socket", "Switch", "Switch"),
+    ("uuid:Lightswitch", "Switch", "LightSwitch"),
+    ("uuid:Insight", "Switch", "Insight"),
+    ("uuid:Sensor", "Motion", "Motion"),
+    ("uuid:Bridge", "Bridge", "Bridge"),
+    ("uuid:Maker", "maker", "Maker"),
+)
+
+
+def _load(name):
+    return getattr(import_module(_LAZY[name]), name)
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        return _load(name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
 class StopBroadcasting(Exception):
     pass
 
@@ -33,7 +66,9 @@ class UnknownDevice(Exception):
     pass
 
 class WeMo(object):
-    def __init__(self, callback=_NOOP, types = _LOTYPES, with_discovery=True, with_subscribers=True):
+    def __init__(self, callback=_NOOP, types = _LOTYPES, with_discovery=True, with_subscribers=True,
+                 session=None, cache=None, coalesce=0, poll_insights=True,
+                 bulk_concurrency=_BULK_CONCURRENCY):
         """
         Create a WeMo environment.
 
@@ -45,6 +80,21 @@ class WeMo(object):
         @type with_discovery:    bool
         @param with_subscribers: Whether to register for events with discovered devices.
         @type with_subscribers:  bool
+        @param session:          The HTTP session manager shared by all devices. One with
+                                 default pool limits is created (and closed on stop) if None.
+        @type session:           SessionManager
+        @param cache:            Where to keep device and service descriptions between runs.
+        @type cache:             aioouimeaux.cache.DescriptionCache
+        @param coalesce:         Deliver at most one value of each device property every
+                                 coalesce seconds, the latest. 0 to deliver all.
+        @type coalesce:          float
+        @param poll_insights:    Whether to poll the measurements of Insights that do not
+                                 send events, because subscribers are off or their
+                                 subscription failed.
+        @type poll_insights:     bool
+        @param bulk_concurrency: How many devices bulk operations, like set_state_many,
+                                 talk to at once, all together.
+        @type bulk_concurrency:  int
         """
         if with_discovery:
             self.upnp = aio.Future()
@@ -56,6 +106,14 @@ class WeMo(object):
         self._with_subscribers = with_subscribers
         self._callback = callback
         self._list_of_types = types
+        self._own_session = session is None
+        self.session = SessionManager() if session is None else session
+        self.cache = cache
+        self._coalesce = coalesce
+        self._poll_insights = poll_insights
+        self.poller = None
+        self._bulk_concurrency = bulk_concurrency
+        self._bulk_limit = None
         self.devices = {}
 
     def __iter__(self):
@@ -72,7 +130,9 @@ class WeMo(object):
 
         if self._with_subscribers:
             # Start the server to listen to events
-            self.registry = SubscriptionRegistry()
+            self.registry = _load("SubscriptionRegistry")(session=self.session,
+                                                          coalesce=self._coalesce,
+                                                          on_failure=self._subscription_failed)
             server = self.registry.server
             xx = aio.ensure_future(server)
 
@@ -102,10 +162,97 @@ class WeMo(object):
 
 
     def stop(self):
+        """
+        Stop discovery, subscriptions and polling. Returns a future done once
+        the HTTP session and the event server are closed, to wait for before
+        closing the event loop.
+        """
+        closing = []
         if self._with_subscribers:
-            self.registry.close()
+            closing.append(self.registry.close())
         if self._with_discovery:
             self.upnp.close()
+        if self.poller is not None:
+            self.poller.close()
+        if self._own_session:
+            closing.append(aio.ensure_future(self.session.close()))
+        return aio.gather(*[future for future in closing if future is not None])
+
+    def events(self, maxsize=100, policy="drop-oldest"):
+        """
+        Returns an async iterator over the events received from all devices,
+        as aioouimeaux.events.Event records.
+
+        @param maxsize: How many events to queue for a slow consumer.
+        @type maxsize:  int
+        @param policy:  What to do when the queue is full: "drop-oldest", or
+                        "coalesce-latest" to keep only the latest value of
+                        each device property.
+        @type policy:   str
+        """
+        if getattr(self, "registry", None) is None:
+            raise RuntimeError("Events need with_subscribers=True, and start()")
+        return self.registry.stream(maxsize, policy)
+
+    def energy(self, count=None, since=None, until=None):
+        """
+        Summarize the energy use of every Insight, and of all of them
+        together. See aioouimeaux.analytics.rollup.
+        """
+        from aioouimeaux.analytics import rollup
+        insights = {name: device for name, device in self.devices.items()
+                    if hasattr(device, "history")}
+        return rollup(insights, count, since, until)
+
+    def _resolve(self, devices):
+        # Unknown names are kept, to fail on their own
+        return [self.devices.get(device, device) if isinstance(device, str) else device
+                for device in devices]
+
+    def _run_many(self, devices, func, timeout):
+        if self._bulk_limit is None:
+            self._bulk_limit = aio.Semaphore(self._bulk_concurrency)
+
+        def call(device):
+            if isinstance(device, str):
+                raise UnknownDevice(device)
+            return func(device)
+        return run_many(self._resolve(devices), call, self._bulk_limit, timeout)
+
+    async def set_state_many(self, devices, state, timeout=_BULK_TIMEOUT):
+        """
+        Switch many devices on or off at once.
+
+        @param devices: Devices, or their names.
+        @type devices:  list
+        @param state:   0 for off, 1 for on.
+        @type state:    int
+        @param timeout: Seconds each device has to answer.
+        @type timeout:  float
+        @return:        A list of aioouimeaux.bulk.Outcome, in the order of devices.
+                        A name that is not known gets an ERROR Outcome with
+                        UnknownDevice, and the name as its device.
+        """
+        return await self._run_many(devices, lambda device: device.set_state(state), timeout)
+
+    async def on_many(self, devices, timeout=_BULK_TIMEOUT):
+        """
+        Switch many devices on. See set_state_many.
+        """
+        return await self.set_state_many(devices, 1, timeout)
+
+    async def off_many(self, devices, timeout=_BULK_TIMEOUT):
+        """
+        Switch many devices off. See set_state_many.
+        """
+        return await self.set_state_many(devices, 0, timeout)
+
+    async def refresh_state_many(self, devices, timeout=_BULK_TIMEOUT):
+        """
+        Fetch the state of many devices. Each Outcome's result is the state.
+        See set_state_many.
+        """
+        return await self._run_many(devices, lambda device: device.refresh_state(), timeout)
 
     def discover(self, seconds=3):
         """
@@ -121,32 +268,42 @@ class WeMo(object):
         address = kwargs['address']
         headers = kwargs['headers']
         usn = headers['usn']
-        if usn.startswith('uuid:Socket') and "Switch" in self._list_of_types:
-            klass = Switch
-        elif usn.startswith('uuid:Lightswitch') and "Switch" in self._list_of_types:
-            klass = LightSwitch
-        elif usn.startswith('uuid:Insight') and "Switch" in self._list_of_types:
-            klass = Insight
-        elif usn.startswith('uuid:Sensor') and "Motion" in self._list_of_types:
-            klass = Motion
-        elif usn.startswith('uuid:Bridge') and "Bridge" in self._list_of_types:
-            klass = Bridge
-        elif usn.startswith('uuid:Maker') and "maker" in self._list_of_types:
-        	klass = Maker
+        for prefix, type_, name in _USN_CLASSES:
+            if usn.startswith(prefix) and type_ in self._list_of_types:
+                klass = _load(name)
+                break
         else:
             log.info("Unrecognized device type. USN={0}".format(usn))
             return
-        device = klass(headers['location'])
+        device = klass(headers['location'], session=self.session, cache=self.cache)
         aio.ensure_future(self._found_device_end(device,address))
 
 
     async def _found_device_end(self,device,address):
-        await device.initialized
+        try:
+            await device.initialized
+        except Exception as e:
+            log.warning("Could not initialize the device at %s: %s", address, e)
+            return
         log.info("Found device %r at %s" % (device, address))
         self._process_device(device)
 
+    def _poll(self, device):
+        if not self._poll_insights or not hasattr(device, "_insight_params"):
+            return
+        if self.poller is None:
+            from aioouimeaux.poller import InsightPoller
+            self.poller = InsightPoller()
+        self.poller.add(device)
+
+    def _subscription_failed(self, device):
+        if self.devices.get(device.name) is device:
+            self._poll(device)
+
     def device_gone(self, device):
         #try:
+        if self.poller is not None:
+            self.poller.remove(device)
         if self._with_discovery:
             self.upnp.connection_lost(device._config.UDN)
         if self._with_subscribers:
@@ -163,7 +320,9 @@ class WeMo(object):
                 self.registry.register(device)
                 #self.registry.on(device, 'BinaryState',
                                 #device._update_state)
-            if isinstance(device, Bridge):
+            else:
+                self._poll(device)
+            if device.device_type == "Bridge":
                 pass
             else:
                 device.ping()
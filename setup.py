@@ -38,7 +38,7 @@ setup(
     install_requires=requirements,
     license="BSD",
     zip_safe=False,
-    python_requires='>=3.5',
+    python_requires='>=3.7',
     keywords='aioouimeaux WeMo automation',
     classifiers=[
         'Development Status :: 4 - Beta',
@@ -46,8 +46,7 @@ setup(
         'Intended Audience :: Developers',
         'License :: OSI Approved :: BSD License',
         'Natural Language :: English',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
     ],
     test_suite='tests',
 )
@@ -1,2 +1,42 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+"""
+Helpers shared by the tests.
+"""
+
+import os
+import unittest
+
+import asyncio as aio
+
+# Benchmarks race wall-clock times, which is too noisy for the unit suite.
+# They run only when this is set in the environment.
+BENCH_ENV = 'AIOOUIMEAUX_BENCH'
+
+benchmark = unittest.skipUnless(os.environ.get(BENCH_ENV),
+                                "benchmark, set {} to run it".format(BENCH_ENV))
+
+
+def run(coro):
+    """
+    Run coro to completion on a new event loop, then cancel whatever tasks
+    it left behind and close the loop.
+    """
+    loop = aio.new_event_loop()
+    aio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        pending = aio.all_tasks(loop)
+        for task in pending:
+            task.cancel()
+        loop.run_until_complete(aio.gather(*pending, return_exceptions=True))
+        loop.close()
+        aio.set_event_loop(None)
+
+
+async def no_xml(self, url):
+    """
+    Stands in for Device._get_xml, for devices that never fetch their
+    descriptions.
+    """
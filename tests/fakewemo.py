@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+A fake WeMo device served by aiohttp, for the tests.
+"""
+
+import os
+import re
+import asyncio as aio
+from contextlib import asynccontextmanager
+
+from aiohttp import web
+
+from aioouimeaux.utils import SessionManager
+
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+
+RESPONSE_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">
+ <s:Body>
+  <u:{action}Response xmlns:u="urn:Belkin:service:{service}:1">
+{args}
+  </u:{action}Response>
+ </s:Body>
+</s:Envelope>"""
+
+FAULT_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">
+ <s:Body>
+  <s:Fault>
+<faultcode>s:Client</faultcode>
+<faultstring>UPnPError</faultstring>
+<detail>
+<UPnPError xmlns="urn:schemas-upnp-org:control-1-0">
+<errorCode>{code}</errorCode>
+<errorDescription>{description}</errorDescription>
+</UPnPError>
+</detail>
+  </s:Fault>
+ </s:Body>
+</s:Envelope>"""
+
+INSIGHT_PARAMS = '1|1510000000|120|3600|86400|1209600|19|45000|1250000|98000000|8000'
+
+
+def data(name):
+    with open(os.path.join(DATA, name), 'rb') as f:
+        return f.read()
+
+
+class FakeWeMo(object):
+    """
+    Serves setup.xml, the service descriptions and answers a few SOAP actions.
+    Every request is recorded in self.requests as (method, path, soapaction).
+    Actions in self.faults are answered with their (errorCode,
+    errorDescription) as a UPnPError, and documents in self.truncated are
+    served cut in half, as many times as it says.
+    """
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.state = 0
+        self.insight_params = INSIGHT_PARAMS
+        self.faults = {}
+        self.truncated = {}
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.runner = None
+        self.port = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d/setup.xml' % self.port
+
+    def count(self, path=None, action=None, method=None):
+        return len([x for x in self.requests
+                    if (method is None or x[0] == method) and
+                    (path is None or x[1] == path) and
+                    (action is None or x[2] == action)])
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_route("*", "/{path:.*}", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    async def handle(self, request):
+        soapaction = request.headers.get('SOAPACTION', '').strip('"').split('#')[-1] or None
+        self.requests.append((request.method, request.path, soapaction))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.delay:
+                await aio.sleep(self.delay)
+            if request.method == 'SUBSCRIBE':
+                return web.Response(headers={'SID': 'uuid:fake-sid-1',
+                                             'TIMEOUT': 'Second-300'})
+            if request.method == 'UNSUBSCRIBE':
+                return web.Response()
+            if request.method == 'POST':
+                return self.control(soapaction, await request.text())
+            name = request.path.lstrip('/')
+            if os.path.exists(os.path.join(DATA, name)):
+                body = data(name)
+                if self.truncated.get(name):
+                    self.truncated[name] -= 1
+                    body = body[:len(body) // 2]
+                return web.Response(body=body, content_type='text/xml')
+            return web.Response(status=404)
+        finally:
+            self.in_flight -= 1
+
+    def control(self, action, body):
+        service = 'basicevent'
+        if action in self.faults:
+            code, description = self.faults[action]
+            body = FAULT_TEMPLATE.format(code=code, description=description)
+            return web.Response(status=500, body=body.encode(), content_type='text/xml')
+        if action == 'GetBinaryState':
+            args = {'BinaryState': self.state}
+        elif action == 'SetBinaryState':
+            state = int(re.search(r'<BinaryState>(\d+)</BinaryState>', body).group(1))
+            if state not in (0, 1):
+                body = FAULT_TEMPLATE.format(code=501, description='Action Failed')
+                return web.Response(status=500, body=body.encode(), content_type='text/xml')
+            self.state = state
+            args = {'BinaryState': self.state}
+        elif action == 'GetInsightParams':
+            service = 'insight'
+            args = {'InsightParams': self.insight_params}
+        else:
+            args = {}
+        body = RESPONSE_TEMPLATE.format(
+            action=action, service=service,
+            args='\n'.join('<{0}>{1}</{0}>'.format(k, v) for k, v in args.items()))
+        return web.Response(body=body.encode(), content_type='text/xml')
+
+
+@asynccontextmanager
+async def serving(delay=0):
+    """
+    A started FakeWeMo, and a SessionManager to talk to it. Both are closed on
+    the way out.
+    """
+    fake = await FakeWeMo(delay=delay).start()
+    session = SessionManager()
+    try:
+        yield fake, session
+    finally:
+        await session.close()
+        await fake.stop()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_analytics
+----------------------------------
+
+Tests for `aioouimeaux.analytics`.
+"""
+
+import random
+import timeit
+import unittest
+
+from aioouimeaux.analytics import summarize, rollup
+from aioouimeaux.timeseries import PowerSeries, _numpy
+
+from . import benchmark
+
+
+def series(samples, use_numpy=None, capacity=16):
+    result = PowerSeries(capacity, use_numpy=use_numpy)
+    for timestamp, power, state in samples:
+        result.append(timestamp, power, 0, 0, state)
+    return result
+
+
+# 1 kW for an hour, standby for half an hour, then off
+SAMPLES = [(0.0, 1000000, 1), (3600.0, 0, 8), (5400.0, 0, 0)]
+
+
+class AnalyticsTests(object):
+    use_numpy = None
+
+    def test_summary(self):
+        summary = summarize(series(SAMPLES, self.use_numpy))
+        self.assertEqual(summary.samples, 3)
+        self.assertEqual(summary.duration, 5400.0)
+        self.assertAlmostEqual(summary.kwh, 1.0)
+        self.assertAlmostEqual(summary.average_mw, 1000000 / 1.5)
+        self.assertEqual(summary.peak_mw, 1000000)
+        self.assertEqual(summary.on_time, 3600.0)
+        self.assertEqual(summary.standby_time, 1800.0)
+        self.assertEqual(summary.off_time, 0.0)
+
+    def test_until_and_since(self):
+        summary = summarize(series(SAMPLES, self.use_numpy), until=9000.0)
+        self.assertEqual(summary.off_time, 3600.0)
+        self.assertAlmostEqual(summary.kwh, 1.0)
+        summary = summarize(series(SAMPLES, self.use_numpy), since=3000.0, until=5400.0)
+        self.assertEqual(summary.samples, 2)
+        self.assertEqual(summary.kwh, 0.0)
+        self.assertEqual(summary.standby_time, 1800.0)
+
+    def test_empty(self):
+        self.assertEqual(summarize(series([], self.use_numpy)).samples, 0)
+        self.assertEqual(summarize(series(SAMPLES[:1], self.use_numpy)).duration, 0.0)
+
+    def test_rollup(self):
+        result = rollup({'a': series(SAMPLES, self.use_numpy),
+                         'b': series(SAMPLES[:2], self.use_numpy)})
+        self.assertEqual(sorted(result.devices), ['a', 'b'])
+        self.assertAlmostEqual(result.total.kwh, 2.0)
+        self.assertAlmostEqual(result.total.average_mw, 1000000 / 1.5 + 1000000)
+        self.assertEqual(result.total.on_time, 7200.0)
+
+
+class TestPythonAnalytics(AnalyticsTests, unittest.TestCase):
+    use_numpy = False
+
+
+@unittest.skipIf(_numpy() is None, "numpy is not installed")
+class TestNumpyAnalytics(AnalyticsTests, unittest.TestCase):
+    use_numpy = True
+
+    def test_same_as_python(self):
+        rng = random.Random(1)
+        samples, now = [], 0.0
+        for i in range(1000):
+            now += rng.uniform(1, 60)
+            samples.append((now, rng.randrange(0, 2000000), rng.choice((0, 1, 8))))
+        fast = summarize(series(samples, True, 1000), until=now + 30)
+        slow = summarize(series(samples, False, 1000), until=now + 30)
+        for a, b in zip(fast, slow):
+            self.assertAlmostEqual(a, b, places=3)
+
+    @benchmark
+    def test_faster_than_python(self):
+        # A fleet of plugs with a day of samples each
+        samples = [(60.0 * i, (i * 7919) % 2000000, i % 3) for i in range(1440)]
+        fleet = {}
+        for use_numpy in (True, False):
+            fleet[use_numpy] = {name: series(samples, use_numpy, 1440) for name in range(50)}
+        fast = min(timeit.repeat(lambda: rollup(fleet[True]), number=5, repeat=5))
+        slow = min(timeit.repeat(lambda: rollup(fleet[False]), number=5, repeat=5))
+        self.assertLess(fast, slow)
+
+
+if __name__ == '__main__':
+    unittest.main()
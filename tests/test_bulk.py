@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_bulk
+----------------------------------
+
+Tests for the bulk operations of `aioouimeaux.wemo.WeMo`.
+"""
+
+import unittest
+import asyncio as aio
+from unittest import mock
+
+from aioouimeaux.bulk import OK, TIMEOUT, ERROR
+from aioouimeaux.device.maker import Maker
+from aioouimeaux.wemo import WeMo, UnknownDevice
+
+from . import run, no_xml
+
+
+class FakeSwitch(object):
+    in_flight = 0
+    max_in_flight = 0
+
+    def __init__(self, name, delay=0.01, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.state = None
+
+    def set_state(self, state):
+        return aio.ensure_future(self._set_state(state))
+
+    async def _set_state(self, state):
+        cls = FakeSwitch
+        cls.in_flight += 1
+        cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            await aio.sleep(self.delay)
+            if self.fail:
+                raise ValueError(self.name)
+            self.state = state
+            return {'BinaryState': str(state)}
+        finally:
+            cls.in_flight -= 1
+
+    async def refresh_state(self):
+        return self.state
+
+
+class TestBulk(unittest.TestCase):
+
+    def test_off_many(self):
+        async def scenario():
+            FakeSwitch.max_in_flight = 0
+            wemo = WeMo(with_discovery=False, with_subscribers=False, bulk_concurrency=5)
+            switches = [FakeSwitch('switch %d' % i) for i in range(20)]
+            switches.append(FakeSwitch('stuck', delay=10))
+            switches.append(FakeSwitch('broken', fail=True))
+            for switch in switches:
+                wemo.devices[switch.name] = switch
+            results = await wemo.off_many([s.name for s in switches[:-1]] + [switches[-1], 'gone'],
+                                          timeout=0.1)
+            states = await wemo.refresh_state_many(switches[:2])
+            await wemo.stop()
+            return switches, results, states
+
+        switches, results, states = run(scenario())
+        self.assertEqual([r.device for r in results], switches + ['gone'])
+        self.assertEqual([r.status for r in results], [OK] * 20 + [TIMEOUT, ERROR, ERROR])
+        self.assertEqual(results[0].result, {'BinaryState': '0'})
+        self.assertIsInstance(results[-2].error, ValueError)
+        self.assertIsInstance(results[-1].error, UnknownDevice)
+        self.assertEqual([s.state for s in switches[:20]], [0] * 20)
+        self.assertEqual(FakeSwitch.max_in_flight, 5)
+        self.assertEqual([(r.status, r.result) for r in states], [(OK, 0), (OK, 0)])
+
+    @mock.patch('aioouimeaux.device.Device._get_xml', no_xml)
+    def test_maker_failure_is_reported(self):
+        class FailingBasicEvent(object):
+            def SetBinaryState(self, BinaryState):
+                future = aio.Future()
+                future.set_exception(ValueError(BinaryState))
+                return future
+
+        async def scenario():
+            wemo = WeMo(with_discovery=False, with_subscribers=False)
+            maker = Maker('http://127.0.0.1:49153/setup.xml')
+            maker.basicevent = FailingBasicEvent()
+            results = await wemo.set_state_many([maker], 1)
+            await wemo.stop()
+            return results
+
+        [result] = run(scenario())
+        self.assertEqual(result.status, ERROR)
+        self.assertIsInstance(result.error, ValueError)
+
+
+if __name__ == '__main__':
+    unittest.main()
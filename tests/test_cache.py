@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_cache
+----------------------------------
+
+Tests for `aioouimeaux.cache`.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from aioouimeaux.cache import DescriptionCache
+
+
+class TestDescriptionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = DescriptionCache(self.tmpdir.name, max_size=1024)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        key = ("Insight", "WeMo_WW_2.00", "/eventservice.xml")
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, b"<scpd/>")
+        self.assertEqual(self.cache.get(key), b"<scpd/>")
+        self.assertIsNone(self.cache.get(("Insight", "WeMo_WW_2.01", "/eventservice.xml")))
+
+    def test_corrupted_entry_is_dropped(self):
+        key = ("Socket", "1", "/eventservice.xml")
+        self.cache.put(key, b"<scpd>something</scpd>")
+        filename = self.cache._filename(key)
+        with open(filename, "r+b") as f:
+            f.seek(-3, os.SEEK_END)
+            f.write(b"XXX")
+        self.assertIsNone(self.cache.get(key))
+        self.assertFalse(os.path.exists(filename))
+
+    def test_eviction(self):
+        body = b"x" * 400
+        for i in range(4):
+            key = ("Socket", "1", str(i))
+            self.cache.put(key, body)
+            os.utime(self.cache._filename(key), (i, i))
+        self.assertIsNone(self.cache.get(("Socket", "1", "0")))
+        self.assertEqual(self.cache.get(("Socket", "1", "3")), body)
+
+    def test_directory_scanned_once(self):
+        body = b"x" * 100
+        with mock.patch("os.listdir", wraps=os.listdir) as listdir:
+            for i in range(5):
+                self.cache.put(("Socket", "1", str(i)), body)
+            # Rewriting an entry does not grow the cache
+            for i in range(5):
+                self.cache.put(("Socket", "1", "0"), body)
+        self.assertEqual(listdir.call_count, 1)
+        self.cache.remove(("Socket", "1", "0"))
+        self.assertIsNone(self.cache.get(("Socket", "1", "0")))
+        with mock.patch("os.listdir", wraps=os.listdir) as listdir:
+            for i in range(5, 7):
+                self.cache.put(("Socket", "1", str(i)), body)
+            self.assertEqual(listdir.call_count, 0)
+            # Over max_size
+            self.cache.put(("Socket", "1", "7"), body)
+            self.assertEqual(listdir.call_count, 1)
+        size = sum(os.path.getsize(os.path.join(self.tmpdir.name, name))
+                   for name in os.listdir(self.tmpdir.name))
+        self.assertEqual(self.cache._size, size)
+        self.assertLessEqual(size, 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_description
+----------------------------------
+
+Tests for `aioouimeaux.device.api.description`, with a benchmark against the
+generateDS parsers it replaces.
+"""
+
+import subprocess
+import sys
+import timeit
+import unittest
+
+from aioouimeaux.device.api.description import parse_device, parse_service
+from aioouimeaux.device.api.xsd import device as deviceParser
+from aioouimeaux.device.api.xsd import service as serviceParser
+
+from .fakewemo import data
+from . import benchmark
+
+
+def import_time(module):
+    """
+    Time to import module, on its own, in a fresh interpreter, in seconds.
+    """
+    code = ("import importlib.util, time, {0}; "
+            "spec = importlib.util.find_spec('{1}'); "
+            "start = time.perf_counter(); "
+            "spec.loader.exec_module(importlib.util.module_from_spec(spec)); "
+            "print(time.perf_counter() - start)".format(module.rpartition('.')[0], module))
+    out = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE,
+                         universal_newlines=True, check=True).stdout
+    return float(out)
+
+
+class TestParseDevice(unittest.TestCase):
+
+    def test_fields(self):
+        device = parse_device(data('setup.xml'))
+        self.assertEqual(device.friendlyName, 'Test Insight')
+        self.assertEqual(device.modelName, 'Insight')
+        self.assertEqual(device.UDN, 'uuid:Insight-1_0-221517K0101769')
+        self.assertEqual(device.firmwareVersion, 'WeMo_WW_2.00.11057.PVT-OWRT-Insight')
+        self.assertEqual([s.serviceType for s in device.serviceList],
+                         ['urn:Belkin:service:basicevent:1',
+                          'urn:Belkin:service:insight:1',
+                          'urn:Belkin:service:metainfo:1'])
+        basicevent = device.serviceList[0]
+        self.assertEqual(basicevent.SCPDURL, '/eventservice.xml')
+        self.assertEqual(basicevent.controlURL, '/upnp/control/basicevent1')
+        self.assertEqual(basicevent.eventSubURL, '/upnp/event/basicevent1')
+
+    def test_same_as_generateds(self):
+        raw = data('setup.xml')
+        old = deviceParser.parseString(raw).device
+        new = parse_device(raw)
+        for name in ('friendlyName', 'modelName', 'modelDescription', 'serialNumber', 'UDN'):
+            self.assertEqual(getattr(new, name), getattr(old, name))
+        self.assertEqual([(s.serviceType, s.SCPDURL, s.controlURL, s.eventSubURL)
+                          for s in new.serviceList],
+                         [(s.get_serviceType(), s.get_SCPDURL(), s.get_controlURL(),
+                           s.get_eventSubURL()) for s in old.serviceList.service])
+
+
+class TestParseService(unittest.TestCase):
+
+    def test_actions(self):
+        scpd = parse_service(data('eventservice.xml'))
+        names = [action.name for action in scpd.actions]
+        self.assertEqual(names, ['SetBinaryState', 'GetBinaryState', 'GetFriendlyName',
+                                 'ChangeFriendlyName', 'GetIconURL', 'SetHomeId'])
+        argument = scpd.actions[0].arguments[0]
+        self.assertEqual((argument.name, argument.direction, argument.relatedStateVariable),
+                         ('BinaryState', 'in', 'BinaryState'))
+
+    def test_state_variables(self):
+        scpd = parse_service(data('eventservice.xml'))
+        variables = {v.name: v for v in scpd.stateVariables}
+        self.assertEqual(variables['BinaryState'].dataType, 'Boolean')
+        self.assertEqual(variables['BinaryState'].sendEvents, 'yes')
+        self.assertIsNone(variables['BinaryState'].allowedValueRange)
+        self.assertEqual(variables['HomeId'].allowedValueRange, ('0', '999999', '1'))
+
+    def test_same_as_generateds(self):
+        for name in ('eventservice.xml', 'insightservice.xml', 'metainfoservice.xml'):
+            raw = data(name)
+            old = serviceParser.parseString(raw).actionList.get_action()
+            new = parse_service(raw).actions
+            self.assertEqual(
+                [(a.name, [arg.name for arg in a.arguments]) for a in new],
+                [(a.get_name(), [arg.get_name() for arg in a.get_argumentList().get_argument()])
+                 for a in old])
+
+
+@benchmark
+class TestBenchmark(unittest.TestCase):
+    """
+    The new parsers must beat generateDS both at parsing and importing.
+    """
+
+    def test_parse_time(self):
+        # What a device bring-up parses: its setup.xml and each service
+        setup = data('setup.xml')
+        scpds = [data(name) for name in
+                 ('eventservice.xml', 'insightservice.xml', 'metainfoservice.xml')]
+
+        def new():
+            parse_device(setup)
+            for raw in scpds:
+                parse_service(raw)
+
+        def old():
+            deviceParser.parseString(setup)
+            for raw in scpds:
+                serviceParser.parseString(raw)
+
+        new_time = min(timeit.repeat(new, number=100, repeat=7))
+        old_time = min(timeit.repeat(old, number=100, repeat=7))
+        self.assertLess(new_time, old_time)
+
+    def test_import_time(self):
+        new_time = min(import_time("aioouimeaux.device.api.description") for _ in range(3))
+        old_time = min(import_time("aioouimeaux.device.api.xsd.service") +
+                       import_time("aioouimeaux.device.api.xsd.device") for _ in range(3))
+        self.assertLess(new_time, old_time)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_device
+----------------------------------
+
+Tests for `aioouimeaux.device`, against a fake WeMo.
+"""
+
+import tempfile
+import time
+import unittest
+import asyncio as aio
+from unittest import mock
+
+from aioouimeaux.cache import DescriptionCache
+from aioouimeaux.device import Device
+from aioouimeaux.device.maker import Maker
+from aioouimeaux.device.api import service
+from aioouimeaux.device.api.description import parse_device
+from aioouimeaux.device.api.dispatcher import Dispatcher
+from aioouimeaux.device.api.soap import SOAPFault
+from aioouimeaux.device.api.types import InvalidArgument
+
+from .fakewemo import data, serving
+from . import run, no_xml
+
+
+class TestDeviceInit(unittest.TestCase):
+
+    def setUp(self):
+        service._SCHEMAS.clear()
+
+    def test_services_are_fetched_concurrently(self):
+        delay = 0.2
+
+        async def scenario():
+            async with serving(delay=delay) as (fake, session):
+                start = time.monotonic()
+                device = Device(fake.url, session=session)
+                await device.initialized
+                elapsed = time.monotonic() - start
+            return fake, elapsed
+
+        fake, elapsed = run(scenario())
+        self.assertEqual(fake.count(path='/setup.xml'), 1)
+        self.assertEqual(fake.max_in_flight, 3)
+        # setup.xml, then the three service descriptions side by side
+        self.assertLess(elapsed, 4 * delay)
+
+    def test_warm_cache_only_fetches_setup(self):
+        async def scenario(cache):
+            async with serving() as (fake, session):
+                device = Device(fake.url, session=session, cache=cache)
+                await device.initialized
+            return fake, device
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cold, device = run(scenario(DescriptionCache(tmpdir)))
+            warm, device = run(scenario(DescriptionCache(tmpdir)))
+        self.assertEqual(device.firmware_version, 'WeMo_WW_2.00.11057.PVT-OWRT-Insight')
+        self.assertEqual(device.get_state(), 0)
+        self.assertEqual(cold.count(method='GET'), 4)
+        self.assertEqual(warm.count(method='GET'), 1)
+        self.assertEqual(warm.count(path='/setup.xml'), 1)
+
+    def test_unreadable_cache_entries_are_fetched_again(self):
+        async def scenario(cache):
+            async with serving() as (fake, session):
+                device = Device(fake.url, session=session, cache=cache)
+                await device.initialized
+            return fake, device
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = DescriptionCache(tmpdir)
+            cold, device = run(scenario(cache))
+            config = device._config
+            # Stored whole, but not XML
+            for svc in config.serviceList:
+                cache.put((config.modelName, config.firmwareVersion, svc.SCPDURL), b'<scpd')
+            service._SCHEMAS.clear()
+            refetched, device = run(scenario(cache))
+            service._SCHEMAS.clear()
+            warm, device = run(scenario(DescriptionCache(tmpdir)))
+        self.assertEqual(refetched.count(method='GET'), 4)
+        self.assertEqual(warm.count(method='GET'), 1)
+        self.assertEqual(device.get_state(), 0)
+
+    def test_bad_download_is_not_cached(self):
+        async def scenario(cache):
+            async with serving() as (fake, session):
+                fake.truncated['eventservice.xml'] = 1
+                config = parse_device(data('setup.xml')).serviceList[0]
+                basicevent = service.Service(config, fake.url.rsplit('/', 1)[0], session=session,
+                                             cache=cache, cache_key=('Insight', '1'))
+                with self.assertRaises(Exception):
+                    await basicevent.initialized
+                return config
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = DescriptionCache(tmpdir)
+            config = run(scenario(cache))
+            self.assertIsNone(cache.get(('Insight', '1', config.SCPDURL)))
+
+    def test_service_failure_fails_initialized(self):
+        async def scenario():
+            async with serving() as (fake, session):
+                fake.truncated['insightservice.xml'] = 1
+                device = Device(fake.url, session=session)
+                await aio.wait_for(device.initialized, 5)
+
+        with self.assertRaises(Exception) as cm:
+            run(scenario())
+        self.assertNotIsInstance(cm.exception, aio.TimeoutError)
+
+    def test_state_seeded_through_fetch_state(self):
+        class Seeded(Device):
+            async def _fetch_state(self):
+                return 1
+
+        async def scenario():
+            async with serving() as (fake, session):
+                device = Seeded(fake.url, session=session)
+                await device.initialized
+            return fake, device
+
+        fake, device = run(scenario())
+        self.assertEqual(device.get_state(), 1)
+        self.assertEqual(fake.count(action='GetBinaryState'), 0)
+
+    def test_waiters_retry_a_failed_shared_load(self):
+        async def scenario():
+            async with serving(delay=0.05) as (fake, session):
+                # Fails for the first device only
+                fake.truncated['eventservice.xml'] = 1
+                devices = [Device(fake.url, session=session) for _ in range(3)]
+                results = await aio.gather(*[device.initialized for device in devices],
+                                           return_exceptions=True)
+            return fake, results
+
+        fake, results = run(scenario())
+        self.assertIsInstance(results[0], Exception)
+        self.assertEqual(results[1:], [True, True])
+        # The failed load, then one more for both waiters
+        self.assertEqual(fake.count(path='/eventservice.xml'), 2)
+
+    def test_identical_devices_share_schemas(self):
+        async def scenario():
+            async with serving(delay=0.05) as (fake, session):
+                devices = [Device(fake.url, session=session) for _ in range(3)]
+                await aio.gather(*[device.initialized for device in devices])
+            return fake, devices
+
+        fake, devices = run(scenario())
+        self.assertEqual(fake.count(path='/setup.xml'), 3)
+        self.assertEqual(fake.count(path='/eventservice.xml'), 1)
+        first, second = devices[0].basicevent, devices[1].basicevent
+        self.assertIs(first.schema, second.schema)
+        self.assertIs(first.GetBinaryState._schema, second.GetBinaryState._schema)
+        self.assertEqual(first.SetBinaryState.args, ('BinaryState',))
+
+
+class TestActions(unittest.TestCase):
+
+    def setUp(self):
+        service._SCHEMAS.clear()
+
+    def test_identical_reads_share_one_request(self):
+        async def scenario():
+            async with serving(delay=0.05) as (fake, session):
+                config = parse_device(data('setup.xml')).serviceList[0]
+                basicevent = service.Service(config, fake.url.rsplit('/', 1)[0], session=session)
+                await basicevent.initialized
+                reads = [basicevent.GetBinaryState() for _ in range(5)]
+                other = basicevent.GetFriendlyName()
+                self.assertEqual(len(basicevent._inflight), 2)
+                writes = [basicevent.SetBinaryState(BinaryState=1) for _ in range(2)]
+                results = await aio.gather(*reads + writes)
+                self.assertEqual(results, [{'BinaryState': False}] * 5 + [{'BinaryState': True}] * 2)
+                # Each caller has its own copy
+                self.assertIsNot(results[0], results[1])
+                await other
+                self.assertEqual(basicevent._inflight, {})
+                # Each caller has its own future
+                self.assertEqual(len(set(map(id, reads))), 5)
+                # Once done, the next read is a new request
+                self.assertEqual(await basicevent.GetBinaryState(), {'BinaryState': True})
+            return fake
+
+        fake = run(scenario())
+        self.assertEqual(fake.count(action='GetBinaryState'), 2)
+        self.assertEqual(fake.count(action='GetFriendlyName'), 1)
+        self.assertEqual(fake.count(action='SetBinaryState'), 2)
+
+
+    def test_fault(self):
+        async def scenario():
+            async with serving() as (fake, session):
+                config = parse_device(data('setup.xml')).serviceList[0]
+                basicevent = service.Service(config, fake.url.rsplit('/', 1)[0], session=session)
+                await basicevent.initialized
+                fake.faults['SetBinaryState'] = (501, 'Action Failed')
+                with self.assertRaises(SOAPFault) as cm:
+                    await basicevent.SetBinaryState(BinaryState=1)
+                return cm.exception
+
+        fault = run(scenario())
+        self.assertEqual((fault.error_code, fault.error_description), ('501', 'Action Failed'))
+
+    def test_arguments_checked_before_sending(self):
+        async def scenario():
+            async with serving() as (fake, session):
+                config = parse_device(data('setup.xml')).serviceList[0]
+                basicevent = service.Service(config, fake.url.rsplit('/', 1)[0], session=session)
+                await basicevent.initialized
+                for call, kwargs in ((basicevent.SetBinaryState, {'BinaryState': 5}),
+                                     (basicevent.SetBinaryState, {'State': 1}),
+                                     (basicevent.SetHomeId, {'HomeId': 10 ** 7}),
+                                     (basicevent.SetHomeId, {'HomeId': 'home'})):
+                    with self.assertRaises(InvalidArgument):
+                        await call(**kwargs)
+                # Encoded by type
+                self.assertEqual(await basicevent.SetBinaryState(BinaryState=True),
+                                 {'BinaryState': True})
+                await basicevent.SetHomeId(HomeId='42')
+            return fake
+
+        fake = run(scenario())
+        self.assertEqual(fake.count(action='SetBinaryState'), 1)
+        self.assertEqual(fake.count(action='SetHomeId'), 1)
+        self.assertEqual(fake.state, 1)
+
+    def test_one_request_at_a_time_control_first(self):
+        async def scenario():
+            dispatcher = Dispatcher()
+            async with serving(delay=0.02) as (fake, session):
+                configs = parse_device(data('setup.xml')).serviceList
+                base_url = fake.url.rsplit('/', 1)[0]
+                basicevent, insight = [service.Service(config, base_url, session=session,
+                                                       dispatcher=dispatcher)
+                                       for config in configs[:2]]
+                await aio.gather(basicevent.initialized, insight.initialized)
+                fake.max_in_flight = 0
+                calls = [insight.GetInsightParams(), basicevent.GetFriendlyName(),
+                         basicevent.GetIconURL()]
+                await aio.sleep(0)
+                calls.append(basicevent.SetBinaryState(BinaryState=1))
+                await aio.gather(*calls, return_exceptions=True)
+            return fake, dispatcher
+
+        fake, dispatcher = run(scenario())
+        actions = [action for method, path, action in fake.requests if method == 'POST']
+        self.assertEqual(actions, ['GetInsightParams', 'SetBinaryState',
+                                   'GetFriendlyName', 'GetIconURL'])
+        self.assertEqual(fake.max_in_flight, 1)
+        self.assertEqual(dispatcher.stats()['lanes']['control']['dispatched'], 1)
+
+
+class FakeBasicEvent(object):
+
+    def __init__(self, state):
+        self.state = state
+        self.calls = 0
+
+    def GetBinaryState(self):
+        self.calls += 1
+
+        async def answer():
+            await aio.sleep(0.01)
+            return {'BinaryState': str(self.state)}
+        return aio.ensure_future(answer())
+
+
+MAKER_ATTRIBUTES = ('&lt;attribute&gt;&lt;name&gt;Switch&lt;/name&gt;&lt;value&gt;1&lt;/value&gt;&lt;/attribute&gt;'
+                    '&lt;attribute&gt;&lt;name&gt;Sensor&lt;/name&gt;&lt;value&gt;0&lt;/value&gt;&lt;/attribute&gt;'
+                    '&lt;attribute&gt;&lt;name&gt;SwitchMode&lt;/name&gt;&lt;value&gt;0&lt;/value&gt;&lt;/attribute&gt;'
+                    '&lt;attribute&gt;&lt;name&gt;SensorPresent&lt;/name&gt;&lt;value&gt;1&lt;/value&gt;&lt;/attribute&gt;')
+
+
+
+class FakeDeviceEvent(object):
+
+    def GetAttributes(self):
+        future = aio.Future()
+        future.set_result({'attributeList': MAKER_ATTRIBUTES})
+        return future
+
+
+@mock.patch('aioouimeaux.device.Device._get_xml', no_xml)
+class TestDeviceState(unittest.TestCase):
+
+    def make_device(self, state, **kwargs):
+        device = Device('http://127.0.0.1:49153/setup.xml', **kwargs)
+        device.basicevent = FakeBasicEvent(state)
+        self.changes = []
+        device.register_callback('statechange', lambda d: self.changes.append(d.get_state()))
+        return device
+
+    def test_refresh_is_shared(self):
+        async def scenario():
+            device = self.make_device(1)
+            states = await aio.gather(*[device.refresh_state() for _ in range(5)])
+            self.assertEqual(states, [1] * 5)
+            self.assertEqual(device.basicevent.calls, 1)
+            # Unchanged: no callback
+            await device.refresh_state()
+            self.assertEqual(device.basicevent.calls, 2)
+
+        run(scenario())
+        self.assertEqual(self.changes, [1])
+
+    def test_get_state_refreshes_in_the_background(self):
+        async def scenario():
+            device = self.make_device(1)
+            self.assertIsNone(device.get_state())
+            self.assertIsNone(device.get_state())
+            await aio.sleep(0.05)
+            self.assertEqual(device.basicevent.calls, 1)
+            self.assertEqual(device.get_state(), 1)
+            # Fresh: answered from the last known state
+            device.basicevent.state = 0
+            self.assertEqual(device.get_state(), 1)
+            self.assertEqual(device.get_state(force_update=True), 1)
+            await aio.sleep(0.05)
+            self.assertEqual(device.get_state(), 0)
+            self.assertEqual(device.basicevent.calls, 2)
+
+        run(scenario())
+        self.assertEqual(self.changes, [1, 0])
+
+    def test_state_ttl(self):
+        async def scenario(clock):
+            clock.monotonic.return_value = 100.0
+            device = self.make_device(1, state_ttl=0.05)
+            await device.refresh_state()
+            self.assertTrue(device.state_is_fresh)
+            clock.monotonic.return_value = 100.04
+            self.assertTrue(device.state_is_fresh)
+            device.get_state()
+            self.assertEqual(device.basicevent.calls, 1)
+            clock.monotonic.return_value = 100.06
+            self.assertFalse(device.state_is_fresh)
+            device.get_state()
+            await device._refreshing
+            self.assertEqual(device.basicevent.calls, 2)
+            self.assertTrue(device.state_is_fresh)
+
+        # Only the device's clock: the event loop keeps the real one
+        with mock.patch('aioouimeaux.device.time') as clock:
+            run(scenario(clock))
+
+    def test_maker_resync_reads_the_switch(self):
+        async def scenario():
+            device = Maker('http://127.0.0.1:49153/setup.xml')
+            device.basicevent = FakeBasicEvent(0)
+            device.deviceevent = FakeDeviceEvent()
+            changes = []
+            device.register_callback('statechange', lambda d: changes.append(d._state))
+            await device.resync()
+            self.assertEqual(device.basicevent.calls, 0)
+            return changes
+
+        self.assertEqual(run(scenario()), [1])
+
+    def test_maker_get_state(self):
+        async def scenario():
+            device = Maker('http://127.0.0.1:49153/setup.xml')
+            device.basicevent = FakeBasicEvent(0)
+            device.deviceevent = FakeDeviceEvent()
+            self.assertIsNone(device.get_state(force_update=True))
+            await device._refreshing
+            self.assertEqual(device.get_state(), 1)
+            self.assertEqual(await device.sensor_state(), 0)
+            self.assertEqual(await device.has_sensor(), 1)
+            self.assertEqual(device.basicevent.calls, 0)
+
+        run(scenario())
+
+
+if __name__ == '__main__':
+    unittest.main()
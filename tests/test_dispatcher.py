@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_dispatcher
+----------------------------------
+
+Tests for `aioouimeaux.device.api.dispatcher`.
+"""
+
+import unittest
+import asyncio as aio
+
+from aioouimeaux.device.api.dispatcher import Dispatcher, CONTROL, READ
+
+from . import run
+
+
+class TestDispatcher(unittest.TestCase):
+
+    def test_control_goes_first(self):
+        order = []
+
+        async def request(dispatcher, name, lane):
+            async with dispatcher.lane(lane):
+                order.append(name)
+                await aio.sleep(0.01)
+
+        async def scenario():
+            dispatcher = Dispatcher()
+            tasks = [aio.ensure_future(request(dispatcher, 'read%d' % i, READ)) for i in range(3)]
+            await aio.sleep(0)
+            self.assertEqual(dispatcher.depth, 2)
+            tasks.append(aio.ensure_future(request(dispatcher, 'set', CONTROL)))
+            await aio.sleep(0)
+            stats = dispatcher.stats()
+            self.assertEqual(stats['in_flight'], 1)
+            self.assertEqual(stats['lanes']['control']['depth'], 1)
+            await aio.gather(*tasks)
+            return dispatcher.stats()
+
+        stats = run(scenario())
+        self.assertEqual(order, ['read0', 'set', 'read1', 'read2'])
+        self.assertEqual(stats['in_flight'], 0)
+        self.assertEqual(stats['lanes']['read']['dispatched'], 3)
+        self.assertEqual(stats['lanes']['read']['depth'], 0)
+        self.assertGreater(stats['lanes']['read']['max_wait'], 0.015)
+        self.assertLess(stats['lanes']['control']['max_wait'], 0.015)
+
+    def test_limit_and_cancel(self):
+        running = []
+        peak = []
+
+        async def request(dispatcher):
+            async with dispatcher.lane(READ):
+                running.append(1)
+                peak.append(len(running))
+                await aio.sleep(0.01)
+                running.pop()
+
+        async def scenario():
+            dispatcher = Dispatcher(limit=2)
+            tasks = [aio.ensure_future(request(dispatcher)) for i in range(6)]
+            await aio.sleep(0)
+            tasks[3].cancel()
+            await aio.gather(*tasks, return_exceptions=True)
+            self.assertEqual(dispatcher.depth, 0)
+            self.assertEqual(dispatcher.in_flight, 0)
+
+        run(scenario())
+        self.assertEqual(max(peak), 2)
+        self.assertEqual(len(peak), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
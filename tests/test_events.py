@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_events
+----------------------------------
+
+Tests for `aioouimeaux.events`.
+"""
+
+import unittest
+import asyncio as aio
+from unittest import mock
+
+from aioouimeaux.events import Event, EventStream, DROP_OLDEST, COALESCE_LATEST
+from aioouimeaux.subscribe import SubscriptionRegistry
+
+from . import run
+
+
+def device(udn):
+    return mock.Mock(udn=udn)
+
+
+A = device('uuid:a')
+B = device('uuid:b')
+
+
+def event(dev, prop, value):
+    return Event(dev, prop, value, 0.0, None)
+
+
+async def drain(stream):
+    stream.close()
+    return [(e.device.udn, e.property, e.value) async for e in stream]
+
+
+class TestEventStream(unittest.TestCase):
+
+    def test_drop_oldest(self):
+        stream = EventStream(maxsize=2, policy=DROP_OLDEST)
+        for value in '123':
+            stream.put(event(A, 'BinaryState', value))
+        self.assertEqual(stream.dropped, 1)
+        self.assertEqual(run(drain(stream)),
+                         [('uuid:a', 'BinaryState', '2'), ('uuid:a', 'BinaryState', '3')])
+
+    def test_coalesce_latest(self):
+        stream = EventStream(maxsize=2, policy=COALESCE_LATEST)
+        stream.put(event(A, 'BinaryState', '1'))
+        stream.put(event(B, 'BinaryState', '1'))
+        stream.put(event(A, 'BinaryState', '0'))
+        self.assertEqual(len(stream), 2)
+        stream.put(event(A, 'FriendlyName', 'Lamp'))
+        self.assertEqual(stream.dropped, 2)
+        self.assertEqual(run(drain(stream)),
+                         [('uuid:a', 'BinaryState', '0'), ('uuid:a', 'FriendlyName', 'Lamp')])
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, EventStream, policy='block')
+
+    def test_consumer_waits_and_close_ends_iteration(self):
+        async def scenario():
+            registry = SubscriptionRegistry()
+            stream = registry.stream()
+            received = []
+
+            async def consume():
+                async for e in stream:
+                    received.append((e.property, e.value, e.seq))
+
+            task = aio.ensure_future(consume())
+            await aio.sleep(0)
+            registry._event(A, 'BinaryState', '1', 7)
+            await aio.sleep(0)
+            registry.close()
+            await task
+            # Closed streams no longer receive events
+            registry._event(A, 'BinaryState', '0')
+            self.assertEqual(len(stream), 0)
+            self.assertEqual(registry._streams, set())
+            return received
+
+        self.assertEqual(run(scenario()), [('BinaryState', '1', 7)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_import
+----------------------------------
+
+Keep `import aioouimeaux.wemo` cheap: heavy dependencies are only imported
+when they are needed.
+"""
+
+import subprocess
+import sys
+import unittest
+
+from . import benchmark
+
+# Cumulative "python -X importtime" budget for aioouimeaux.wemo, in microseconds
+BUDGET = 200000
+
+HEAVY = ('aiohttp', 'aiohttp_wsgi', 'async_timeout', 'netifaces',
+         'urllib.request', 'http.client',
+         'aioouimeaux.subscribe', 'aioouimeaux.device.api.xsd',
+         'aioouimeaux.device.switch', 'aioouimeaux.device.insight',
+         'aioouimeaux.device.bridge', 'aioouimeaux.device.maker')
+
+
+def import_time(module):
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                         stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+    for line in out.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1])
+    raise AssertionError("%s not found in -X importtime output" % module)
+
+
+class TestImport(unittest.TestCase):
+
+    def test_heavy_modules_are_lazy(self):
+        code = "import sys, aioouimeaux.wemo; print('\\n'.join(sys.modules))"
+        out = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE,
+                             universal_newlines=True, check=True).stdout
+        loaded = [name for name in out.split() if name.startswith(HEAVY)]
+        self.assertEqual(loaded, [])
+
+    @benchmark
+    def test_import_time_budget(self):
+        cumulative = min(import_time("aioouimeaux.wemo") for _ in range(3))
+        self.assertLess(cumulative, BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_insight
+----------------------------------
+
+Tests for `aioouimeaux.device.insight`.
+"""
+
+import unittest
+import asyncio as aio
+from unittest import mock
+
+from aioouimeaux.device.insight import Insight, parse_insight_params
+from aioouimeaux.subscribe import SubscriptionRegistry
+
+from .fakewemo import INSIGHT_PARAMS
+from . import run, no_xml
+
+NOTIFY = """<e:propertyset xmlns:e="urn:schemas-upnp-org:event-1-0">
+<e:property>
+<BinaryState>{}</BinaryState>
+</e:property>
+</e:propertyset>\n\n"""
+
+
+@mock.patch('aioouimeaux.device.Device._get_xml', no_xml)
+class TestInsight(unittest.TestCase):
+
+    def make_insight(self):
+        insight = Insight('http://127.0.0.1:49153/setup.xml')
+        insight._config = mock.Mock(UDN='uuid:Insight-1_0-221517K0101769')
+        insight.insight = mock.Mock()
+        return insight
+
+    def test_measurements_from_events(self):
+        async def scenario():
+            insight = self.make_insight()
+            registry = SubscriptionRegistry()
+            registry._hosts[insight.host] = insight
+            registry.on(insight, 'BinaryState', insight._update_state)
+            registry.on(insight, 'InsightParams', insight._update_insight)
+            registry._notify(insight, NOTIFY.format(INSIGHT_PARAMS).encode())
+            self.assertEqual(insight.get_state(), 1)
+            self.assertEqual(insight.current_power, parse_insight_params(INSIGHT_PARAMS)['current power'])
+            self.assertEqual(insight.today_on_time, parse_insight_params(INSIGHT_PARAMS)['today on time'])
+            self.assertEqual(len(insight.history), 1)
+            self.assertEqual(insight.history.latest().current, 45000)
+            # Fresh from the event: nothing fetched
+            self.assertFalse(insight.insight.GetInsightParams.called)
+            # A plain state change leaves the measurements alone
+            registry._notify(insight, NOTIFY.format('0').encode())
+            self.assertEqual(insight.get_state(), 0)
+            self.assertEqual(insight.measurements['state'], '1')
+            registry.close()
+
+        run(scenario())
+
+    def test_fetch_when_stale(self):
+        async def scenario():
+            insight = self.make_insight()
+            future = aio.Future()
+            future.set_result({'InsightParams': INSIGHT_PARAMS})
+            insight.insight.GetInsightParams.return_value = future
+            insight.insight_params
+            insight.insight_params
+            await aio.sleep(0)
+            self.assertEqual(insight.insight.GetInsightParams.call_count, 1)
+            self.assertEqual(insight.measurements, parse_insight_params(INSIGHT_PARAMS))
+            insight.insight_params
+            self.assertEqual(insight.insight.GetInsightParams.call_count, 1)
+
+        run(scenario())
+
+    def test_resync_shares_the_fetch(self):
+        async def scenario():
+            insight = self.make_insight()
+            changes = []
+            insight.register_callback('statechange', lambda d: changes.append(d.get_state()))
+            answer = aio.Future()
+            insight.insight.GetInsightParams.return_value = answer
+            insight.insight_params
+            resyncs = aio.gather(insight.resync(), insight.resync())
+            await aio.sleep(0)
+            answer.set_result({'InsightParams': INSIGHT_PARAMS})
+            await resyncs
+            self.assertEqual(insight.insight.GetInsightParams.call_count, 1)
+            # Unchanged: no callback
+            answer = aio.Future()
+            answer.set_result({'InsightParams': INSIGHT_PARAMS})
+            insight.insight.GetInsightParams.return_value = answer
+            await insight.resync()
+            self.assertEqual(insight.insight.GetInsightParams.call_count, 2)
+            return changes
+
+        self.assertEqual(run(scenario()), [1])
+
+    def test_polled_state_changes(self):
+        async def scenario():
+            insight = self.make_insight()
+            changes = []
+            insight.register_callback('statechange', lambda d: changes.append(d.get_state()))
+            for params in (INSIGHT_PARAMS, INSIGHT_PARAMS, '0' + INSIGHT_PARAMS[1:]):
+                answer = aio.Future()
+                answer.set_result({'InsightParams': params})
+                insight.insight.GetInsightParams.return_value = answer
+                # What InsightPoller calls
+                await insight._insight_params()
+            return changes
+
+        self.assertEqual(run(scenario()), [1, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_poller
+----------------------------------
+
+Tests for `aioouimeaux.poller`.
+"""
+
+import itertools
+import time
+import unittest
+import asyncio as aio
+
+from aioouimeaux.poller import InsightPoller
+from aioouimeaux.timeseries import PowerSeries
+
+from . import run
+
+
+class FakeInsight(object):
+    in_flight = 0
+    max_in_flight = 0
+
+    def __init__(self, udn, powers):
+        self.udn = udn
+        self.powers = itertools.cycle(powers)
+        self.history = PowerSeries(16)
+        self.polled = 0
+        self._evented = None
+
+    async def _insight_params(self):
+        cls = FakeInsight
+        cls.in_flight += 1
+        cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            await aio.sleep(0.005)
+            self.polled += 1
+            self.history.append(time.time(), next(self.powers), 0, 0, 1)
+        finally:
+            cls.in_flight -= 1
+
+
+class TestInsightPoller(unittest.TestCase):
+
+    def test_interval_follows_power_variance(self):
+        async def scenario():
+            poller = InsightPoller(min_interval=0.01, max_interval=0.08)
+            steady = FakeInsight('uuid:steady', [1000])
+            busy = FakeInsight('uuid:busy', [100, 2000])
+            poller.add(steady)
+            poller.add(busy)
+            await aio.sleep(0.3)
+            intervals = poller.interval(steady), poller.interval(busy)
+            polled = steady.polled, busy.polled
+            poller.close()
+            return intervals, polled
+
+        (steady, busy), (steady_polls, busy_polls) = run(scenario())
+        self.assertEqual(steady, 0.08)
+        self.assertEqual(busy, 0.01)
+        self.assertGreater(busy_polls, steady_polls)
+
+    def test_no_polls_while_events_arrive(self):
+        async def scenario():
+            poller = InsightPoller(min_interval=0.01, max_interval=0.02)
+            device = FakeInsight('uuid:evented', [1000])
+            poller.add(device)
+            for i in range(10):
+                device._evented = time.monotonic()
+                await aio.sleep(0.01)
+            poller.close()
+            return device.polled, poller.skipped
+
+        polled, skipped = run(scenario())
+        self.assertEqual(polled, 0)
+        self.assertGreater(skipped, 0)
+
+    def test_failure_slows_down(self):
+        class BrokenInsight(FakeInsight):
+            async def _insight_params(self):
+                raise OSError(self.udn)
+
+        async def scenario():
+            poller = InsightPoller(min_interval=1, max_interval=10)
+            device = BrokenInsight('uuid:broken', [1000])
+            poller.add(device)
+            await poller._poll(poller._polls[device.udn])
+            interval = poller.interval(device)
+            poller.close()
+            return interval
+
+        self.assertEqual(run(scenario()), 1.5)
+
+    def test_spread_and_concurrency(self):
+        async def scenario():
+            FakeInsight.max_in_flight = 0
+            poller = InsightPoller(concurrency=3, min_interval=0.05)
+            devices = [FakeInsight('uuid:%d' % i, [1000]) for i in range(20)]
+            for device in devices:
+                poller.add(device)
+            now = aio.get_event_loop().time()
+            dues = sorted(entry[0] - now for entry in poller.scheduler._jobs.values())
+            await aio.sleep(0.1)
+            poller.remove(devices[0])
+            self.assertNotIn(devices[0], poller)
+            poller.close()
+            return dues, [device.polled for device in devices]
+
+        dues, polled = run(scenario())
+        # First polls are spread over the whole interval, without clusters
+        self.assertLess(dues[0], 0.01)
+        self.assertGreater(dues[-1], 0.04)
+        gaps = [b - a for a, b in zip(dues, dues[1:])]
+        self.assertLess(max(gaps), 0.01)
+        self.assertLessEqual(FakeInsight.max_in_flight, 3)
+        self.assertTrue(all(polled))
+
+
+if __name__ == '__main__':
+    unittest.main()
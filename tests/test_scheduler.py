@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_scheduler
+----------------------------------
+
+Tests for `aioouimeaux.scheduler`.
+"""
+
+import unittest
+import asyncio as aio
+
+from aioouimeaux.scheduler import Scheduler
+
+from . import run
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_order_replace_and_cancel(self):
+        done = []
+
+        def job(name):
+            async def run():
+                done.append(name)
+            return run
+
+        async def scenario():
+            scheduler = Scheduler()
+            scheduler.schedule('c', 0.03, job('c'))
+            scheduler.schedule('a', 0.01, job('a'))
+            scheduler.schedule('b', 0.5, job('b'))
+            scheduler.schedule('b', 0.02, job('b'))
+            scheduler.schedule('d', 0.02, job('d'))
+            scheduler.cancel('d')
+            self.assertEqual(scheduler.pending, 3)
+            self.assertIn('a', scheduler)
+            await aio.sleep(0.1)
+            self.assertEqual(scheduler.pending, 0)
+            scheduler.close()
+
+        run(scenario())
+        self.assertEqual(done, ['a', 'b', 'c'])
+
+    def test_concurrency_limit(self):
+        running = []
+        peak = []
+        release = None
+
+        async def job():
+            running.append(1)
+            peak.append(len(running))
+            await release.wait()
+            running.pop()
+
+        async def scenario():
+            nonlocal release
+            release = aio.Event()
+            scheduler = Scheduler(concurrency=2)
+            for i in range(5):
+                scheduler.schedule(i, 0, job)
+            await aio.sleep(0.05)
+            self.assertEqual(len(running), 2)
+            self.assertEqual(scheduler.pending, 3)
+            self.assertEqual(scheduler.overdue, 3)
+            release.set()
+            await aio.sleep(0.05)
+            self.assertEqual(scheduler.pending, 0)
+            self.assertEqual(scheduler.overdue, 0)
+            scheduler.close()
+
+        run(scenario())
+        self.assertEqual(max(peak), 2)
+        self.assertEqual(len(peak), 5)
+
+    def test_jitter_only_brings_jobs_forward(self):
+        async def scenario():
+            scheduler = Scheduler()
+            loop = aio.get_event_loop()
+            now = loop.time()
+            for i in range(20):
+                scheduler.schedule(i, 100, None, jitter=0.1)
+            dues = [entry[0] - now for entry in scheduler._jobs.values()]
+            scheduler.close()
+            return dues
+
+        dues = run(scenario())
+        self.assertTrue(all(89 < due <= 100.1 for due in dues))
+        self.assertGreater(len(set(dues)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
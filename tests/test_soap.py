@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_soap
+----------------------------------
+
+Tests for `aioouimeaux.device.api.soap`.
+"""
+
+import timeit
+import unittest
+from xml.etree import ElementTree as et
+
+from aioouimeaux.device.api.soap import (Envelope, SOAPError, SOAPFault, parse_response,
+                                         _CACHE_SIZE)
+
+from .fakewemo import RESPONSE_TEMPLATE, FAULT_TEMPLATE, INSIGHT_PARAMS
+from . import benchmark
+
+SERVICE = 'urn:Belkin:service:basicevent:1'
+
+# How Action built its bodies before
+OLD_TEMPLATE = """
+<?xml version="1.0" encoding="utf-8"?>
+<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/" s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">
+ <s:Body>
+  <u:{action} xmlns:u="{service}">
+   {args}
+  </u:{action}>
+ </s:Body>
+</s:Envelope>
+"""
+
+
+def old_build(action, service, kwargs):
+    arglist = '\n'.join('<{0}>{1}</{0}>'.format(arg, value) for arg, value in kwargs.items())
+    return OLD_TEMPLATE.format(action=action, service=service, args=arglist).strip().encode()
+
+
+def arguments(body):
+    action = et.fromstring(body)[0][0]
+    return action.tag, {child.tag: child.text for child in action}
+
+
+class TestEnvelope(unittest.TestCase):
+
+    def test_same_document_as_before(self):
+        envelope = Envelope('SetBinaryState', SERVICE)
+        body = envelope.build({'BinaryState': 1})
+        self.assertEqual(arguments(body), arguments(old_build('SetBinaryState', SERVICE,
+                                                              {'BinaryState': 1})))
+        self.assertEqual(arguments(body), ('{%s}SetBinaryState' % SERVICE, {'BinaryState': '1'}))
+        self.assertEqual(arguments(Envelope('GetBinaryState', SERVICE).build({})),
+                         ('{%s}GetBinaryState' % SERVICE, {}))
+
+    def test_escaping(self):
+        value = '<?xml version="1.0"?><DeviceStatus>A & B</DeviceStatus>'
+        body = Envelope('SetDeviceStatus', SERVICE).build({'DeviceStatusList': value})
+        self.assertEqual(arguments(body)[1], {'DeviceStatusList': value})
+
+    def test_cache(self):
+        envelope = Envelope('SetBinaryState', SERVICE)
+        self.assertIs(envelope.build({}), envelope.build({}))
+        self.assertIs(envelope.build({'BinaryState': 1}), envelope.build({'BinaryState': 1}))
+        for i in range(3 * _CACHE_SIZE):
+            envelope.build({'BinaryState': i})
+        self.assertLessEqual(len(envelope._bodies), _CACHE_SIZE + 1)
+        # Unhashable values are not cached, but work
+        self.assertIn(b'[1]', envelope.build({'BinaryState': [1]}))
+
+    @benchmark
+    def test_faster_than_template(self):
+        envelope = Envelope('GetBinaryState', SERVICE)
+        setter = Envelope('SetBinaryState', SERVICE)
+
+        def new():
+            envelope.build({})
+            setter.build({'BinaryState': 1})
+
+        def old():
+            old_build('GetBinaryState', SERVICE, {})
+            old_build('SetBinaryState', SERVICE, {'BinaryState': 1})
+
+        new_time = min(timeit.repeat(new, number=2000, repeat=5))
+        old_time = min(timeit.repeat(old, number=2000, repeat=5))
+        self.assertLess(new_time, old_time)
+
+
+def response(action, service='basicevent', **args):
+    return RESPONSE_TEMPLATE.format(
+        action=action, service=service,
+        args='\n'.join('<{0}>{1}</{0}>'.format(k, v) for k, v in args.items())).encode()
+
+
+def old_parse(body):
+    # The getchildren() chain Action used, which Python 3.9 removed
+    return {r.tag: r.text for r in list(list(list(et.fromstring(body))[0])[0])}
+
+
+class TestParseResponse(unittest.TestCase):
+
+    def test_arguments(self):
+        body = response('GetInsightParams', 'insight', InsightParams=INSIGHT_PARAMS)
+        self.assertEqual(parse_response(body, 'GetInsightParams'),
+                         {'InsightParams': INSIGHT_PARAMS})
+        body = response('GetFriendlyName', FriendlyName='A &amp; B', Empty='')
+        self.assertEqual(parse_response(body, 'GetFriendlyName'),
+                         {'FriendlyName': 'A & B', 'Empty': None})
+        self.assertEqual(parse_response(body, 'GetFriendlyName'), old_parse(body) | {'Empty': None})
+
+    def test_stops_after_the_action(self):
+        body = response('GetBinaryState', BinaryState=1) + b'garbage<'
+        self.assertEqual(parse_response(body, 'GetBinaryState'), {'BinaryState': '1'})
+
+    def test_fault(self):
+        body = FAULT_TEMPLATE.format(code=401, description='Invalid Action').encode()
+        with self.assertRaises(SOAPFault) as cm:
+            parse_response(body, 'GetBinaryState')
+        fault = cm.exception
+        self.assertEqual((fault.faultcode, fault.faultstring), ('s:Client', 'UPnPError'))
+        self.assertEqual((fault.error_code, fault.error_description), ('401', 'Invalid Action'))
+        self.assertEqual(str(fault), 'UPnP error 401 Invalid Action')
+
+    def test_errors(self):
+        self.assertRaises(SOAPError, parse_response, response('GetBinaryState'), 'GetIconURL')
+        self.assertRaises(SOAPError, parse_response, b'<html>500</html>', 'GetIconURL')
+        self.assertRaises(SOAPError, parse_response, b'<s:Envelope', 'GetIconURL')
+
+    @benchmark
+    def test_faster_than_tree(self):
+        bodies = [response('GetBinaryState', BinaryState=1),
+                  response('GetInsightParams', 'insight', InsightParams=INSIGHT_PARAMS)]
+
+        def new():
+            parse_response(bodies[0], 'GetBinaryState')
+            parse_response(bodies[1], 'GetInsightParams')
+
+        def old():
+            for body in bodies:
+                old_parse(body)
+
+        new_time = min(timeit.repeat(new, number=2000, repeat=7))
+        old_time = min(timeit.repeat(old, number=2000, repeat=7))
+        self.assertLess(new_time, old_time)
+
+
+if __name__ == '__main__':
+    unittest.main()
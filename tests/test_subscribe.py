@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_subscribe
+----------------------------------
+
+Tests for `aioouimeaux.subscribe`.
+"""
+
+import time
+import unittest
+import warnings
+import asyncio as aio
+from unittest import mock
+
+import aiohttp
+from aiohttp import web
+
+from aioouimeaux.subscribe import Subscription, SubscriptionRegistry
+
+from .fakewemo import serving
+from . import run, benchmark
+
+try:
+    from aiohttp_wsgi import WSGIHandler
+except ImportError:
+    WSGIHandler = None
+
+
+NOTIFY = """<e:propertyset xmlns:e="urn:schemas-upnp-org:event-1-0">
+<e:property>
+<BinaryState>{}</BinaryState>
+</e:property>
+</e:propertyset>\n\n"""
+
+
+class FakeDevice(object):
+    host = '127.0.0.1'
+    udn = 'uuid:Socket-1_0-221517K0101769'
+
+    def __init__(self, url=None):
+        self.basicevent = mock.Mock(eventSubURL=url)
+
+    def _update_state(self, value):
+        pass
+
+    async def resync(self):
+        self.resynced = getattr(self, 'resynced', 0) + 1
+
+
+async def serve(handler):
+    app = web.Application()
+    app.router.add_route("*", "/{path_info:.*}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, 'http://127.0.0.1:%d/' % site._server.sockets[0].getsockname()[1]
+
+
+async def blast(url, count, concurrency=50, sid=None, status=200):
+    """
+    Send count NOTIFYs, concurrency at a time. Returns the elapsed time.
+    """
+    headers = {'NT': 'upnp:event', 'NTS': 'upnp:propchange'}
+    if sid is not None:
+        headers['SID'] = sid
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def one(i):
+            async with session.request("NOTIFY", url, data=NOTIFY.format(i % 2).encode(),
+                                       headers=headers) as r:
+                assert r.status == status
+                await r.read()
+        start = time.perf_counter()
+        await aio.gather(*[one(i) for i in range(count)])
+        return time.perf_counter() - start
+
+
+def make_registry():
+    registry = SubscriptionRegistry()
+    device = FakeDevice()
+    registry._devices[device.udn] = device
+    registry._hosts[device.host] = device
+    received = []
+    registry.on(device, 'BinaryState', received.append)
+    return registry, received
+
+
+class TestNotify(unittest.TestCase):
+
+    def test_native_handler(self):
+        registry, received = make_registry()
+
+        async def scenario():
+            runner, url = await serve(registry._handle_notify)
+            try:
+                await blast(url, 10)
+            finally:
+                await runner.cleanup()
+
+        run(scenario())
+        self.assertEqual(received, ['0', '1'] * 5)
+
+    @benchmark
+    @unittest.skipIf(WSGIHandler is None, "aiohttp_wsgi is not installed")
+    def test_native_handler_beats_wsgi(self):
+        count = 500
+
+        async def scenario(handler):
+            runner, url = await serve(handler)
+            try:
+                await blast(url, 20)
+                return min([await blast(url, count) for _ in range(3)])
+            finally:
+                await runner.cleanup()
+
+        registry, received = make_registry()
+        native = run(scenario(registry._handle_notify))
+        self.assertEqual(len(received), 3 * count + 20)
+        registry, received = make_registry()
+        wsgi = run(scenario(WSGIHandler(registry._handle)))
+        self.assertEqual(len(received), 3 * count + 20)
+        self.assertLess(native, wsgi)
+
+    def test_route_by_sid(self):
+        registry, received = make_registry()
+        # Behind NAT: the device's own address is not the one NOTIFYs come from
+        device = FakeDevice()
+        device.host = '10.0.0.5'
+        device.udn = 'uuid:Socket-1_0-natted'
+        natted = []
+        registry.on(device, 'BinaryState', natted.append)
+        subscription = Subscription(device, None)
+        registry._subscriptions[device.udn] = subscription
+        registry._set_sid(subscription, 'uuid:sid-natted')
+
+        async def scenario():
+            runner, url = await serve(registry._handle_notify)
+            try:
+                await blast(url, 2, sid='uuid:sid-natted')
+                # A stale SID is refused, not delivered to whoever has the address now
+                await blast(url, 2, sid='uuid:sid-stale', status=412)
+            finally:
+                await runner.cleanup()
+
+        run(scenario())
+        self.assertEqual(natted, ['0', '1'])
+        self.assertEqual(received, [])
+
+        registry._set_sid(subscription, 'uuid:sid-renewed')
+        self.assertEqual(list(registry._sids), ['uuid:sid-renewed'])
+        registry.unregister(device)
+        self.assertEqual(registry._sids, {})
+
+    def test_devices_sharing_an_address(self):
+        async def scenario():
+            registry = SubscriptionRegistry()
+            # A port forward: one address, two devices
+            first, second = FakeDevice(), FakeDevice()
+            second.udn = 'uuid:Socket-1_0-forwarded'
+            registry.register(first)
+            registry.register(second)
+            subscriptions = dict(registry._subscriptions)
+            registry._set_sid(subscriptions[first.udn], 'uuid:sid-1')
+            registry._set_sid(subscriptions[second.udn], 'uuid:sid-2')
+            routed = [registry._route(sid, first.host)[0] for sid in ('uuid:sid-1', 'uuid:sid-2')]
+            registry.unregister(second)
+            left = dict(registry._subscriptions), dict(registry._sids)
+            registry.close()
+            return first, second, subscriptions, routed, left
+
+        first, second, subscriptions, routed, left = run(scenario())
+        self.assertEqual(len(subscriptions), 2)
+        self.assertEqual(routed, [first, second])
+        self.assertEqual(left, ({first.udn: subscriptions[first.udn]},
+                                {'uuid:sid-1': subscriptions[first.udn]}))
+
+    def test_server(self):
+        registry, received = make_registry()
+        registry.port = 0
+
+        async def scenario():
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", DeprecationWarning)
+                await registry.server
+            # Port 0 gets IPv4 and IPv6 their own ports
+            port = [port for host, port, *_ in registry._runner.addresses if '.' in host][0]
+            await blast('http://127.0.0.1:%d/' % port, 2)
+            await registry.close()
+            self.assertIsNone(registry._runner)
+
+        run(scenario())
+        self.assertEqual(received, ['0', '1'])
+
+    def test_seq(self):
+        subscription = Subscription(FakeDevice(), None)
+        self.assertTrue(subscription.check_seq(0))
+        self.assertTrue(subscription.check_seq(1))
+        # Lost 2
+        self.assertFalse(subscription.check_seq(3))
+        self.assertTrue(subscription.check_seq(4))
+        # Restarted
+        self.assertFalse(subscription.check_seq(0))
+        subscription.seq = 2 ** 32 - 1
+        self.assertTrue(subscription.check_seq(1))
+        # Missed the initial event
+        subscription.seq = None
+        self.assertFalse(subscription.check_seq(5))
+
+    @mock.patch('aioouimeaux.subscribe._RESYNC_DELAY', 0.05)
+    def test_gap_triggers_one_resync(self):
+        registry, received = make_registry()
+        device = registry._hosts['127.0.0.1']
+        subscription = Subscription(device, None)
+        registry._subscriptions[device.udn] = subscription
+        registry._set_sid(subscription, 'uuid:sid-1')
+
+        async def scenario():
+            runner, url = await serve(registry._handle_notify)
+            try:
+                async with aiohttp.ClientSession() as session:
+                    for seq in (0, 1, 4, 7, 8):
+                        headers = {'SID': 'uuid:sid-1', 'SEQ': str(seq)}
+                        async with session.request("NOTIFY", url, headers=headers,
+                                                   data=NOTIFY.format(1).encode()) as r:
+                            self.assertEqual(r.status, 200)
+                await aio.sleep(0.1)
+            finally:
+                await runner.cleanup()
+
+        run(scenario())
+        self.assertEqual(len(received), 5)
+        self.assertEqual(device.resynced, 1)
+        self.assertEqual(registry.resyncs, 1)
+        self.assertEqual(registry._resyncs, {})
+
+    def test_coalesce(self):
+        registry, received = make_registry()
+        device = registry._hosts['127.0.0.1']
+        other = FakeDevice()
+        other.udn = 'uuid:Socket-1_0-other'
+        unthrottled = []
+        registry.on(other, 'BinaryState', unthrottled.append)
+        registry.coalesce(0.05, device)
+
+        async def scenario():
+            for value in '1010':
+                registry._event(device, 'BinaryState', value)
+                registry._event(other, 'BinaryState', value)
+            # The first value at once, the latest at the end of the window
+            self.assertEqual(received, ['1'])
+            await aio.sleep(0.07)
+            self.assertEqual(received, ['1', '0'])
+            # Nothing held back: the next window delivers nothing
+            await aio.sleep(0.07)
+            registry._event(device, 'BinaryState', '1')
+            self.assertEqual(received, ['1', '0', '1'])
+            registry.close()
+
+        run(scenario())
+        self.assertEqual(unthrottled, list('1010'))
+        self.assertEqual(registry.coalesced, {(device.udn, 'BinaryState'): 2})
+        self.assertEqual(registry._held, {})
+
+    def test_dispatch(self):
+        registry, received = make_registry()
+        device = registry._hosts['127.0.0.1']
+        other = FakeDevice()
+        other.udn = 'uuid:Socket-1_0-other'
+        wildcard = []
+        anydevice = []
+        everything = []
+        registry.on(device, None, lambda *args: wildcard.append(args))
+        registry.on(None, 'BinaryState', lambda *args: anydevice.append(args))
+        handle = registry.on(None, None, lambda *args: everything.append(args))
+        registry._event(device, 'BinaryState', '1')
+        registry._event(device, 'FriendlyName', 'Lamp')
+        registry._event(other, 'BinaryState', '0')
+        registry.off(handle)
+        registry.off(handle)
+        registry._event(other, 'BinaryState', '1')
+        self.assertEqual(received, ['1'])
+        self.assertEqual(wildcard, [(device, 'BinaryState', '1'),
+                                    (device, 'FriendlyName', 'Lamp')])
+        self.assertEqual(anydevice, [(device, 'BinaryState', '1'),
+                                     (other, 'BinaryState', '0'),
+                                     (other, 'BinaryState', '1')])
+        self.assertEqual(len(everything), 3)
+
+
+@mock.patch('aioouimeaux.subscribe.get_ip_address', lambda: '127.0.0.1')
+class TestSubscription(unittest.TestCase):
+
+    def test_subscribe_and_schedule_renewal(self):
+        async def scenario():
+            async with serving() as (fake, session):
+                registry = SubscriptionRegistry(session=session)
+                device = FakeDevice('http://127.0.0.1:%d/upnp/event/basicevent1' % fake.port)
+                try:
+                    registry.register(device)
+                    self.assertEqual(registry.pending_renewals, 1)
+                    while fake.count(method='SUBSCRIBE') < 1:
+                        await aio.sleep(0.01)
+                    await aio.sleep(0.05)
+                    subscription = registry._subscriptions[device.udn]
+                    self.assertEqual(subscription.sid, 'uuid:fake-sid-1')
+                    self.assertEqual(subscription.timeout, 300)
+                    self.assertEqual(registry.pending_renewals, 1)
+                    self.assertEqual(registry.overdue_renewals, 0)
+                    registry.unregister(device)
+                    self.assertEqual(registry.pending_renewals, 0)
+                finally:
+                    registry.close()
+
+        run(scenario())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_telemetry
+----------------------------------
+
+Tests for `aioouimeaux.telemetry`.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from aioouimeaux.events import Event, EventStream
+from aioouimeaux.telemetry import TelemetrySink, BINARY, CSV, files, read
+from aioouimeaux.timeseries import PowerSeries
+
+from .fakewemo import INSIGHT_PARAMS
+from . import run
+
+
+class TelemetryTests(object):
+    format = BINARY
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.device = mock.Mock(udn='uuid:Insight-1_0-221517K0101769')
+        self.device.history = PowerSeries(16)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def sink(self, **kwargs):
+        return TelemetrySink(self.directory, format=self.format, **kwargs)
+
+    def test_series_round_trip(self):
+        sink = self.sink()
+        for i in range(5):
+            self.device.history.append(100.0 + i, i * 1000, i * 10, i * 100, i % 2)
+        sink.write_series(self.device)
+        # Only new samples the second time
+        self.device.history.append(105.0, 5000, 50, 500, 8)
+        sink.write_series(self.device)
+        sink.close()
+        paths = files(self.directory, self.device, self.format)
+        self.assertEqual(len(paths), 1)
+        columns = read(paths[0])
+        self.assertEqual(list(columns.timestamp), [100.0, 101.0, 102.0, 103.0, 104.0, 105.0])
+        self.assertEqual(list(columns.current), [0, 1000, 2000, 3000, 4000, 5000])
+        self.assertEqual(list(columns.state), [0, 1, 0, 1, 0, 8])
+
+    def test_rotation(self):
+        sink = self.sink(max_bytes=200, keep=2, buffer_size=1)
+        for i in range(40):
+            sink.write(self.device, float(i), i, i, i, 1)
+        sink.close()
+        paths = files(self.directory, self.device, self.format)
+        self.assertEqual(len(paths), 2)
+        timestamps = [t for path in paths for t in read(path).timestamp]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual(timestamps[-1], 39.0)
+        self.assertTrue(all(os.path.getsize(path) < 200 + 64 for path in paths))
+
+    def test_event_stream(self):
+        sink = self.sink()
+        stream = EventStream()
+        stream.put(Event(self.device, 'BinaryState', '1', 1.0, None))
+        stream.put(Event(self.device, 'InsightParams', INSIGHT_PARAMS, 2.0, None))
+        stream.close()
+        run(sink.consume(stream))
+        columns = read(files(self.directory, self.device, self.format)[0])
+        self.assertEqual(list(columns.timestamp), [2.0])
+        self.assertEqual(list(columns.current), [45000])
+        self.assertEqual(list(columns.total), [98000000])
+
+
+class TestBinaryTelemetry(TelemetryTests, unittest.TestCase):
+
+    def test_compact(self):
+        sink = self.sink()
+        for i in range(100):
+            sink.write(self.device, float(i), 123456, 1234567, 123456789, 1)
+        sink.close()
+        path = files(self.directory, self.device)[0]
+        self.assertEqual(os.path.getsize(path), 16 + 100 * 33)
+
+    def test_read_without_numpy(self):
+        sink = self.sink()
+        sink.write(self.device, 1.5, 2, 3, 4, 8)
+        sink.close()
+        path = files(self.directory, self.device)[0]
+        with mock.patch('aioouimeaux.telemetry._numpy', lambda: None):
+            columns = read(path)
+        self.assertEqual([list(column) for column in columns], [[1.5], [2], [3], [4], [8]])
+
+
+class TestCSVTelemetry(TelemetryTests, unittest.TestCase):
+    format = CSV
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_timeseries
+----------------------------------
+
+Tests for `aioouimeaux.timeseries`.
+"""
+
+import unittest
+
+from aioouimeaux.timeseries import PowerSeries, _numpy
+
+
+class PowerSeriesTests(object):
+    use_numpy = None
+
+    def make(self, capacity):
+        return PowerSeries(capacity, use_numpy=self.use_numpy)
+
+    def fill(self, series, count):
+        for i in range(count):
+            series.append(100.0 + i, i * 1000, i * 10, i * 100, i % 2)
+
+    def test_append_and_wrap(self):
+        series = self.make(4)
+        self.assertEqual(len(series), 0)
+        self.assertIsNone(series.latest())
+        self.fill(series, 3)
+        self.assertEqual(list(series.window().current), [0, 1000, 2000])
+        self.fill(series, 7)
+        self.assertEqual(len(series), 4)
+        self.assertEqual(list(series.window().timestamp), [103.0, 104.0, 105.0, 106.0])
+        self.assertEqual(list(series.window(2).state), [1, 0])
+        self.assertEqual(series.latest().total, 600)
+
+    def test_since(self):
+        series = self.make(8)
+        self.fill(series, 11)
+        self.assertEqual(list(series.window(since=106.5).today), [70, 80, 90, 100])
+        self.assertEqual(list(series.window(count=2, since=104).today), [90, 100])
+        self.assertEqual(len(series.window(since=200).today), 0)
+
+    def test_window_is_a_view(self):
+        series = self.make(4)
+        self.fill(series, 6)
+        window = series.window()
+        series.append(200.0, 1, 2, 3, 8)
+        # Not a copy: the new sample overwrote the oldest one under the view
+        self.assertEqual(list(window.timestamp), [200.0, 103.0, 104.0, 105.0])
+        self.assertEqual(series.nbytes, 2 * 4 * (8 + 8 + 8 + 8 + 1))
+
+
+class TestArraySeries(PowerSeriesTests, unittest.TestCase):
+    use_numpy = False
+
+    def test_views_are_memoryviews(self):
+        series = self.make(4)
+        self.fill(series, 2)
+        self.assertIsInstance(series.window().current, memoryview)
+
+
+@unittest.skipIf(_numpy() is None, "numpy is not installed")
+class TestNumpySeries(PowerSeriesTests, unittest.TestCase):
+    use_numpy = True
+
+    def test_views_share_memory(self):
+        series = self.make(4)
+        self.fill(series, 6)
+        self.assertIsNotNone(series.window().current.base)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_types
+----------------------------------
+
+Tests for `aioouimeaux.device.api.types`.
+"""
+
+import unittest
+
+from aioouimeaux.device.api.description import StateVariable, parse_service
+from aioouimeaux.device.api.service import ServiceSchema
+from aioouimeaux.device.api.types import ArgumentType, InvalidArgument
+
+from .fakewemo import data
+
+
+def argument(dataType, **kwargs):
+    return ArgumentType('Arg', StateVariable(name='Arg', dataType=dataType, **kwargs))
+
+
+class TestArgumentType(unittest.TestCase):
+
+    def test_boolean(self):
+        boolean = argument('Boolean')
+        for value, text in ((True, '1'), (0, '0'), ('yes', '1'), ('False', '0')):
+            self.assertEqual(boolean.encode(value), text)
+        for value in (2, 'on', None):
+            with self.assertRaises(InvalidArgument):
+                boolean.encode(value)
+        self.assertIs(boolean.decode('1'), True)
+        self.assertIs(boolean.decode('false'), False)
+        # What Insights send
+        self.assertEqual(boolean.decode('8'), 8)
+        self.assertEqual(boolean.decode('1|1510000000|120'), '1|1510000000|120')
+
+    def test_integer_bounds(self):
+        ui1 = argument('ui1')
+        self.assertEqual(ui1.encode('255'), '255')
+        for value in (256, -1, 1.5, 'one'):
+            with self.assertRaises(InvalidArgument):
+                ui1.encode(value)
+        ranged = argument('i4', allowedValueRange=('-10', '10', '5'))
+        self.assertEqual(ranged.encode(-5), '-5')
+        for value in (15, 3):
+            with self.assertRaises(InvalidArgument):
+                ranged.encode(value)
+        self.assertEqual(ranged.decode('10'), 10)
+        self.assertEqual(ranged.decode('n/a'), 'n/a')
+
+    def test_float(self):
+        r8 = argument('r8', allowedValueRange=('0', '1', None))
+        self.assertEqual(r8.encode(0.5), '0.5')
+        self.assertEqual(r8.decode('0.25'), 0.25)
+        with self.assertRaises(InvalidArgument):
+            r8.encode(2)
+
+    def test_float_step(self):
+        r4 = argument('r4', allowedValueRange=('0', '1', '0.1'))
+        for tenths in range(11):
+            self.assertEqual(r4.encode(tenths / 10), str(tenths / 10))
+        for value in (0.3, 0.7, 0.9, '0.3'):
+            r4.encode(value)
+        for value in (0.05, 0.33):
+            with self.assertRaises(InvalidArgument):
+                r4.encode(value)
+
+    def test_allowed_values(self):
+        mode = argument('string', allowedValues=('on', 'off'))
+        self.assertEqual(mode.encode('on'), 'on')
+        with self.assertRaises(InvalidArgument):
+            mode.encode('dim')
+
+    def test_untyped(self):
+        untyped = ArgumentType('Arg')
+        self.assertEqual(untyped.encode(3), '3')
+        self.assertEqual(untyped.decode('3'), '3')
+
+
+class TestActionSchema(unittest.TestCase):
+
+    def setUp(self):
+        schema = ServiceSchema('urn:Belkin:service:basicevent:1',
+                               parse_service(data('eventservice.xml')))
+        self.actions = {action.name: action for action in schema.actions}
+
+    def test_types_from_state_table(self):
+        SetHomeId = self.actions['SetHomeId']
+        self.assertEqual(SetHomeId.types['HomeId'].dataType, 'ui4')
+        self.assertEqual(SetHomeId.encode({'HomeId': 7}), {'HomeId': '7'})
+        with self.assertRaises(InvalidArgument):
+            SetHomeId.encode({'HomeId': 10 ** 6})
+        with self.assertRaises(InvalidArgument):
+            SetHomeId.encode({'Home': 7})
+
+    def test_decode(self):
+        GetBinaryState = self.actions['GetBinaryState']
+        self.assertEqual(GetBinaryState.decode({'BinaryState': '0', 'Other': '1'}),
+                         {'BinaryState': False, 'Other': '1'})
+
+
+if __name__ == '__main__':
+    unittest.main()
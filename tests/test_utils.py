@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_utils
+----------------------------------
+
+Tests for `aioouimeaux.utils`.
+"""
+
+import unittest
+from unittest import mock
+import asyncio as aio
+
+from aiohttp import web
+
+from aioouimeaux.utils import SessionManager
+from aioouimeaux.wemo import WeMo
+
+from . import run
+
+
+class TestSessionManager(unittest.TestCase):
+
+    def test_connections_are_reused(self):
+        peers = set()
+
+        async def handler(request):
+            peers.add(request.transport.get_extra_info('peername'))
+            return web.Response(body=b'<ok/>')
+
+        async def scenario():
+            app = web.Application()
+            app.router.add_route("*", "/{path:.*}", handler)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            url = 'http://127.0.0.1:%d/setup.xml' % port
+            manager = SessionManager(limit_per_host=1)
+            try:
+                for _ in range(5):
+                    response = await manager.get(url)
+                    self.assertEqual(response.raw_body, b'<ok/>')
+                response = await manager.post(url, data=b'x')
+                self.assertEqual(response.status, 200)
+            finally:
+                await manager.close()
+                await runner.cleanup()
+            self.assertTrue(manager.closed)
+
+        run(scenario())
+        self.assertEqual(len(peers), 1)
+
+
+@mock.patch('aioouimeaux.subscribe.get_ip_address', lambda: '127.0.0.1')
+class TestShutdown(unittest.TestCase):
+
+    def test_stop_closes_session_and_server(self):
+        async def scenario():
+            wemo = WeMo(with_discovery=False)
+            wemo.start()
+            await aio.sleep(0.05)
+            runner = wemo.registry._runner
+            self.assertIsNotNone(runner)
+            wemo.session.session
+            await wemo.stop()
+            return wemo, runner
+
+        wemo, runner = run(scenario())
+        self.assertTrue(wemo.session.closed)
+        self.assertIsNone(wemo.registry._runner)
+        self.assertEqual(runner.sites, set())
+
+
+if __name__ == '__main__':
+    unittest.main()